@@ -0,0 +1,42 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, Optional
+
+
+class AsyncRuntime:
+    """Event loop running forever on a dedicated daemon thread.
+
+    Coroutines are submitted from any thread and return `concurrent.futures.Future` objects, so the Streamlit script
+    thread never drives the loop itself.
+    """
+
+    def __init__(self, name: str = "market-monitor-async-runtime"):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def submit(self, coroutine: Coroutine) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self, coroutine: Coroutine, timeout: Optional[float] = None) -> Any:
+        future = self.submit(coroutine)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self):
+        if self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
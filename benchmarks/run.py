@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import gc
+import inspect
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+
+from benchmarks.synthetic import SyntheticInjectiveQueryExecutor, SyntheticMarketData, scaled
+from injective_market import _parse_markets_and_tokens
+from liquidation_store import LiquidationRollupStore, LiquidationStore
+from liquidations import (
+    _liquidation_rollup_pipeline,
+    _liquidation_trades_pipeline,
+    _liquidation_trades_window,
+    scale_rollup_notionals,
+)
+from market_registry import MarketRegistry, MarketRegistryHolder
+from mongodb import MongoSettings
+from open_interest import OraclePriceCache, aggregate_open_interest_columns, fetch_oracle_prices, positions_to_columns
+from orderbooks import OrderbookTracker
+from recording import recording_path, save_recording
+from redemption_store import RedemptionStore
+
+RESULTS_DIRECTORY = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_SCALES = (1, 10, 100)
+# The liquidation stores run with a pinned clock, so the pipelines they issue match the saved recordings
+LIQUIDATION_NOW = datetime(2024, 1, 1, 12)
+LIQUIDATION_DAYS = 7
+
+StageFunction = Callable[[], Union[Any, Awaitable[Any]]]
+
+
+class StageRecorder:
+    """Runs the stages of a benchmark in order and records their duration, or their peak memory.
+
+    The peak memory is the tracemalloc peak during the stage, which covers Python objects and NumPy arrays, plus the
+    growth of the Arrow memory pool, which tracemalloc does not see.
+    """
+
+    def __init__(self, measure_memory: bool):
+        self.measure_memory = measure_memory
+        self.stages: Dict[str, float] = {}
+
+    async def run(self, name: str, stage: StageFunction) -> Any:
+        gc.collect()
+        if self.measure_memory:
+            tracemalloc.reset_peak()
+            memory_before, _ = tracemalloc.get_traced_memory()
+            arrow_memory_before = pa.total_allocated_bytes()
+            result = await _maybe_await(stage())
+            _, peak_memory = tracemalloc.get_traced_memory()
+            arrow_memory_growth = max(0, pa.total_allocated_bytes() - arrow_memory_before)
+            self.stages[name] = peak_memory - memory_before + arrow_memory_growth
+        else:
+            started_at = time.perf_counter()
+            result = await _maybe_await(stage())
+            self.stages[name] = time.perf_counter() - started_at
+        return result
+
+
+async def _maybe_await(value):
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+async def benchmark_markets(data: SyntheticMarketData, recorder: StageRecorder, context: Dict[str, Any]):
+    query_executor = SyntheticInjectiveQueryExecutor(data)
+    spot_markets, derivative_markets, tokens = await recorder.run("fetch", lambda: asyncio.gather(
+        query_executor.spot_markets(),
+        query_executor.derivative_markets(),
+        query_executor.tokens(),
+    ))
+    markets_and_tokens = await recorder.run("parse", lambda: _parse_markets_and_tokens(
+        spot_markets=spot_markets,
+        derivative_markets=derivative_markets,
+        tokens=tokens,
+    ))
+    context["market_registry"] = await recorder.run("index", lambda: MarketRegistryHolder(
+        MarketRegistry.build(markets_and_tokens)))
+
+
+async def benchmark_open_interest(data: SyntheticMarketData, recorder: StageRecorder, context: Dict[str, Any]):
+    from streamlit_pages.open_interest_page import InsuranceFundsPage as OpenInterestPage
+
+    query_executor = SyntheticInjectiveQueryExecutor(data)
+    market_registry = context["market_registry"].current
+
+    async def fetch():
+        positions = await query_executor.chain_positions()
+        oracle_keys = market_registry.oracle_keys()
+        oracle_prices = await fetch_oracle_prices(
+            query_executor=query_executor,
+            oracle_keys=oracle_keys.values(),
+            price_cache=OraclePriceCache(),
+        )
+        prices = {market_id: oracle_prices[key] for market_id, key in oracle_keys.items()}
+        return positions, prices
+
+    positions, prices = await recorder.run("fetch", fetch)
+    columns = await recorder.run("parse", lambda: positions_to_columns(positions["state"]))
+    open_interest = await recorder.run("aggregate", lambda: aggregate_open_interest_columns(
+        columns, market_registry.derivative_markets_map, prices))
+    await recorder.run("render_prep", lambda: OpenInterestPage._open_interest_df(open_interest))
+
+
+async def benchmark_insurance_funds(data: SyntheticMarketData, recorder: StageRecorder, context: Dict[str, Any]):
+    from streamlit_pages.insurance_funds_page import InsuranceFundsPage
+
+    query_executor = SyntheticInjectiveQueryExecutor(data)
+    page = InsuranceFundsPage(async_runtime=None, query_executor=query_executor,
+                              market_registry=context["market_registry"])
+    await recorder.run("fetch", query_executor.insurance_funds)
+    await recorder.run("load_data", page.load_data)
+
+
+async def benchmark_redemptions(data: SyntheticMarketData, recorder: StageRecorder, context: Dict[str, Any]):
+    from streamlit_pages.redemptions_page import RedemptionsPage
+
+    query_executor = SyntheticInjectiveQueryExecutor(data)
+    with tempfile.TemporaryDirectory() as directory:
+        page = RedemptionsPage(async_runtime=None, query_executor=query_executor,
+                               market_registry=context["market_registry"],
+                               redemption_store=RedemptionStore(path=os.path.join(directory, "redemptions.json")))
+        await recorder.run("fetch", query_executor.redemptions)
+        redemptions_df = await recorder.run("load_data", page.load_data)
+        await recorder.run("render_prep", lambda: page.prepare_display_df(redemptions_df, days_lookback=30))
+
+
+async def benchmark_liquidations(data: SyntheticMarketData, recorder: StageRecorder, context: Dict[str, Any]):
+    # The stores query the Mongo replay stand-in, so the stages cover the cursor paging, the Parquet part files and
+    # the materialized rollups, like the liquidations page on a cold store
+    settings = MongoSettings(replay_directory=context["mongo_directory"])
+    start_dt, end_dt = _liquidation_trades_window(days=LIQUIDATION_DAYS, now=LIQUIDATION_NOW)
+    derivative_markets_map = context["market_registry"].current.derivative_markets_map
+    with tempfile.TemporaryDirectory() as directory:
+        trade_store = LiquidationStore(root=os.path.join(directory, "trades"), clock=lambda: LIQUIDATION_NOW,
+                                       mongo_settings=settings)
+        rollup_store = LiquidationRollupStore(root=os.path.join(directory, "rollups"), clock=lambda: LIQUIDATION_NOW,
+                                              mongo_settings=settings)
+        await recorder.run("sync", lambda: trade_store.sync(start_dt=start_dt, end_dt=end_dt))
+        trades = await recorder.run("read", lambda: trade_store.read(start_dt=start_dt, end_dt=end_dt))
+        rollups = await recorder.run("rollups", lambda: rollup_store.get(start_dt=start_dt, end_dt=end_dt))
+        await recorder.run("scale", lambda: scale_rollup_notionals(rollups.to_pandas(), derivative_markets_map))
+        await recorder.run("render_prep", lambda: trades.to_pandas())
+
+
+def save_liquidation_recordings(data: SyntheticMarketData, directory: str):
+    documents = data.liquidation_trade_documents(end_dt=LIQUIDATION_NOW, days=LIQUIDATION_DAYS)
+    start_dt, end_dt = _liquidation_trades_window(days=LIQUIDATION_DAYS, now=LIQUIDATION_NOW)
+    for day in LiquidationStore._days_between(start_dt, end_dt):
+        day_start, day_end = LiquidationStore._day_bounds(day)
+        save_recording(recording_path(directory, "aggregate", None, None,
+                                      _liquidation_trades_pipeline(start_dt=day_start, end_dt=day_end)),
+                       [document for document in documents if day_start <= document["executedAt"] <= day_end])
+
+    # The stand-in does not evaluate pipelines, the rollups are grouped here like the server would
+    trades = pd.DataFrame(documents)
+    trades["bucket"] = trades["executedAt"].dt.floor("h")
+    trades["notional"] = trades["executionPrice"] * trades["executionQuantity"]
+    rollups = trades.groupby(["bucket", "marketId"], as_index=False).agg(
+        count=("tradeId", "count"), notional=("notional", "sum"), quantity=("executionQuantity", "sum"))
+    save_recording(recording_path(directory, "aggregate", None, None,
+                                  _liquidation_rollup_pipeline(start_dt=start_dt, end_dt=end_dt)),
+                   rollups.to_dict("records"))
+
+
+async def benchmark_orderbooks(data: SyntheticMarketData, recorder: StageRecorder, context: Dict[str, Any]):
+    # The stream events are fed to the tracker directly, so the apply stage only covers the book updates
+    from streamlit_pages.orderbooks_page import OrderbooksPage
+
+    _, events = data.orderbooks
+    tracker = OrderbookTracker(query_executor=SyntheticInjectiveQueryExecutor(data),
+                               market_registry=context["market_registry"])
+    await recorder.run("snapshot", tracker.load_snapshots)
+
+    def apply():
+        for event in events:
+            tracker._process_chain_stream_update(event)
+
+    await recorder.run("apply", apply)
+
+    def query():
+        for market_id in tracker.market_ids():
+            tracker.best_bid_ask(market_id)
+            tracker.depth(market_id, levels=10)
+
+    await recorder.run("query", query)
+    await recorder.run("render_prep", lambda: OrderbooksPage._orderbooks_df(tracker))
+
+
+BENCHMARKS = {
+    "markets": benchmark_markets,
+    "open_interest": benchmark_open_interest,
+    "insurance_funds": benchmark_insurance_funds,
+    "redemptions": benchmark_redemptions,
+    "liquidations": benchmark_liquidations,
+    "orderbooks": benchmark_orderbooks,
+}
+
+
+async def run_scale(multiplier: float, benchmark_names: List[str], repeat: int, measure_memory: bool,
+                    seed: int) -> List[Dict[str, Any]]:
+    scale = scaled(multiplier)
+    data = SyntheticMarketData(scale=scale, seed=seed)
+    results = []
+    with tempfile.TemporaryDirectory() as mongo_directory:
+        if "liquidations" in benchmark_names:
+            save_liquidation_recordings(data, mongo_directory)
+        context = {"mongo_directory": mongo_directory}
+
+        # The parsed markets are needed by the other benchmarks, so they are always computed first
+        names = ["markets"] + [name for name in benchmark_names if name != "markets"]
+        for name in names:
+            seconds: Dict[str, float] = {}
+            for _ in range(repeat):
+                recorder = StageRecorder(measure_memory=False)
+                await BENCHMARKS[name](data, recorder, context)
+                for stage, duration in recorder.stages.items():
+                    seconds[stage] = min(duration, seconds.get(stage, duration))
+
+            peak_memory = None
+            if measure_memory:
+                recorder = StageRecorder(measure_memory=True)
+                tracemalloc.start()
+                try:
+                    await BENCHMARKS[name](data, recorder, context)
+                finally:
+                    tracemalloc.stop()
+                peak_memory = recorder.stages
+
+            if name in benchmark_names:
+                results.append({
+                    "benchmark": name,
+                    "scale": multiplier,
+                    "sizes": scale.__dict__,
+                    "stages": {
+                        stage: {
+                            "seconds": duration,
+                            "peak_memory_bytes": peak_memory.get(stage) if peak_memory is not None else None,
+                        }
+                        for stage, duration in seconds.items()
+                    },
+                })
+            print_result_line(name, multiplier, seconds, peak_memory)
+    return results
+
+
+def print_result_line(name: str, multiplier: float, seconds: Dict[str, float], peak_memory: Optional[Dict[str, int]]):
+    stages = []
+    for stage, duration in seconds.items():
+        stage_text = f"{stage}={duration * 1000:.1f}ms"
+        if peak_memory is not None:
+            stage_text += f"/{peak_memory[stage] / 2 ** 20:.1f}MiB"
+        stages.append(stage_text)
+    print(f"{name:<16} {multiplier:>5g}x  " + "  ".join(stages))
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline_path: str):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    baseline_stages = {
+        (result["benchmark"], result["scale"], stage): values["seconds"]
+        for result in baseline["results"]
+        for stage, values in result["stages"].items()
+    }
+    print(f"\nCompared with {baseline.get('commit')} ({baseline_path}), ratio > 1 is slower")
+    for result in results["results"]:
+        for stage, values in result["stages"].items():
+            baseline_seconds = baseline_stages.get((result["benchmark"], result["scale"], stage))
+            if baseline_seconds:
+                print(f"{result['benchmark']:<16} {result['scale']:>5g}x  {stage:<12} "
+                      f"{values['seconds'] / baseline_seconds:6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the data paths on synthetic mainnet-like payloads")
+    parser.add_argument("--scale", type=float, nargs="+", default=DEFAULT_SCALES,
+                        help="multiples of the current mainnet size to run")
+    parser.add_argument("--benchmark", nargs="+", choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS),
+                        help="benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, the fastest one is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file, by default benchmarks/results/<time>-<commit>.json")
+    parser.add_argument("--compare", metavar="RESULT_FILE", help="print the duration ratios against a previous run")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": [],
+        "max_rss_bytes": None,
+    }
+    for multiplier in args.scale:
+        results["results"].extend(asyncio.run(run_scale(multiplier=multiplier,
+                                                        benchmark_names=args.benchmark,
+                                                        repeat=args.repeat,
+                                                        measure_memory=not args.no_memory,
+                                                        seed=args.seed)))
+
+    # ru_maxrss is in kilobytes on Linux
+    results["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIRECTORY, f"{timestamp}-{commit or 'unknown'}.json")
+    with open(output, "w") as output_file:
+        json.dump(results, output_file, indent=1)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
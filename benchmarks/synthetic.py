@@ -0,0 +1,284 @@
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import cached_property
+from typing import Any, Dict, List, Tuple
+
+from pyinjective.core.market import DerivativeMarket, SpotMarket
+from pyinjective.core.token import Token
+
+from injective_query_executor import WrappedInjectiveQueryExecutor
+
+QUOTE_SYMBOL = "USDT"
+QUOTE_DENOM = "peggy0xdAC17F958D2ee523a2206206994597C13D831ec7"
+
+
+@dataclass(frozen=True)
+class SyntheticScale:
+    tokens: int
+    spot_markets: int
+    derivative_markets: int
+    positions: int
+    insurance_funds: int
+    redemptions: int
+    liquidation_trades: int
+    orderbook_levels: int
+    orderbook_updates: int
+
+
+# Approximate mainnet sizes, the 1x scale
+MAINNET_SCALE = SyntheticScale(
+    tokens=300,
+    spot_markets=150,
+    derivative_markets=100,
+    positions=5_000,
+    insurance_funds=100,
+    redemptions=2_000,
+    liquidation_trades=10_000,
+    orderbook_levels=50,
+    orderbook_updates=2_000,
+)
+
+
+def scaled(multiplier: float, base: SyntheticScale = MAINNET_SCALE) -> SyntheticScale:
+    # Row counts grow linearly, while listings grow much slower (100x gives 200 derivative markets)
+    listing_multiplier = multiplier ** 0.15
+    return SyntheticScale(
+        tokens=round(base.tokens * listing_multiplier),
+        spot_markets=round(base.spot_markets * listing_multiplier),
+        derivative_markets=round(base.derivative_markets * listing_multiplier),
+        positions=round(base.positions * multiplier),
+        insurance_funds=round(base.insurance_funds * listing_multiplier),
+        redemptions=round(base.redemptions * multiplier),
+        liquidation_trades=round(base.liquidation_trades * multiplier),
+        orderbook_levels=round(base.orderbook_levels * listing_multiplier),
+        orderbook_updates=round(base.orderbook_updates * multiplier),
+    )
+
+
+class SyntheticMarketData:
+    """Chain and Mongo payloads shaped like the mainnet responses, generated from a seed."""
+
+    def __init__(self, scale: SyntheticScale, seed: int = 0):
+        self.scale = scale
+        self._random = random.Random(seed)
+        self.tokens = self._tokens()
+        self.spot_markets = self._spot_markets()
+        self.derivative_markets = self._derivative_markets()
+        self.oracle_prices = {market.oracle_base: f"{self._random.uniform(0.01, 50_000):.6f}"
+                              for market in self.derivative_markets.values()}
+        self.chain_positions = self._chain_positions()
+        self.insurance_funds = self._insurance_funds()
+        self.redemptions = self._redemptions()
+
+    def _tokens(self) -> Dict[str, Token]:
+        tokens = {QUOTE_SYMBOL: Token(name="Tether", symbol=QUOTE_SYMBOL, denom=QUOTE_DENOM, address="",
+                                      decimals=6, logo="", updated=0)}
+        for index in range(self.scale.tokens - 1):
+            symbol = f"TKN{index}"
+            tokens[symbol] = Token(name=f"Token {index}", symbol=symbol, denom=f"factory/inj1synthetic/{symbol.lower()}",
+                                   address="", decimals=self._random.choice((6, 8, 18)), logo="", updated=0)
+        return tokens
+
+    def _spot_markets(self) -> Dict[str, SpotMarket]:
+        quote_token = self.tokens[QUOTE_SYMBOL]
+        base_tokens = [token for symbol, token in self.tokens.items() if symbol != QUOTE_SYMBOL]
+        spot_markets = {}
+        for index in range(self.scale.spot_markets):
+            base_token = base_tokens[index % len(base_tokens)]
+            market_id = f"0x{index:064x}"
+            spot_markets[market_id] = SpotMarket(
+                id=market_id,
+                status="active",
+                ticker=f"{base_token.symbol}/{QUOTE_SYMBOL}",
+                base_token=base_token,
+                quote_token=quote_token,
+                maker_fee_rate=Decimal("-0.0001"),
+                taker_fee_rate=Decimal("0.001"),
+                service_provider_fee=Decimal("0.4"),
+                min_price_tick_size=Decimal("0.0001"),
+                min_quantity_tick_size=Decimal("1000"),
+            )
+        return spot_markets
+
+    def _derivative_markets(self) -> Dict[str, DerivativeMarket]:
+        quote_token = self.tokens[QUOTE_SYMBOL]
+        derivative_markets = {}
+        for index in range(self.scale.derivative_markets):
+            market_id = f"0x{index + 1_000_000:064x}"
+            derivative_markets[market_id] = DerivativeMarket(
+                id=market_id,
+                status="active",
+                ticker=f"PERP{index}/{QUOTE_SYMBOL} PERP",
+                oracle_base=f"PERP{index}",
+                oracle_quote=QUOTE_SYMBOL,
+                oracle_type="pyth",
+                oracle_scale_factor=6,
+                initial_margin_ratio=Decimal("0.05"),
+                maintenance_margin_ratio=Decimal("0.02"),
+                quote_token=quote_token,
+                maker_fee_rate=Decimal("-0.0001"),
+                taker_fee_rate=Decimal("0.001"),
+                service_provider_fee=Decimal("0.4"),
+                min_price_tick_size=Decimal("100"),
+                min_quantity_tick_size=Decimal("0.0001"),
+            )
+        return derivative_markets
+
+    def _chain_positions(self) -> Dict[str, Any]:
+        market_ids = list(self.derivative_markets)
+        state = []
+        for index in range(self.scale.positions):
+            quantity = self._random.uniform(0.001, 1_000)
+            state.append({
+                "marketId": self._random.choice(market_ids),
+                "subaccountId": f"0x{index:040x}{0:024x}",
+                "position": {
+                    "isLong": self._random.random() < 0.5,
+                    "quantity": str(int(quantity * 1e18)),
+                    "entryPrice": str(int(self._random.uniform(1, 50_000) * 1e24)),
+                    "margin": str(int(self._random.uniform(10, 10_000) * 1e24)),
+                    "cumulativeFundingEntry": "0",
+                },
+            })
+        return {"state": state}
+
+    def _insurance_funds(self) -> Dict[str, Any]:
+        funds = []
+        for index, market in zip(range(self.scale.insurance_funds), self.derivative_markets.values()):
+            funds.append({
+                "depositDenom": QUOTE_DENOM,
+                "insurancePoolTokenDenom": f"share{index}",
+                "redemptionNoticePeriodDuration": "1209600",
+                "balance": str(self._random.randint(0, 10 ** 13)),
+                "totalShare": str(self._random.randint(0, 10 ** 24)),
+                "marketId": market.id,
+                "marketTicker": market.ticker,
+                "oracleBase": market.oracle_base,
+                "oracleQuote": market.oracle_quote,
+                "oracleType": market.oracle_type,
+                "expiry": "-1",
+            })
+        return {"funds": funds}
+
+    def _redemptions(self) -> Dict[str, Any]:
+        now_us = int(datetime.now().timestamp() * 1e6)
+        schedules = []
+        for index in range(self.scale.redemptions):
+            requested_at = now_us - self._random.randint(0, 90 * 24 * 3600) * 1_000_000
+            disbursed = self._random.random() < 0.9
+            schedules.append({
+                "redemptionId": str(index + 1),
+                "status": "disbursed" if disbursed else "pending",
+                "redeemer": f"inj1synthetic{index % 500:032d}",
+                "claimableRedemptionTime": str(requested_at + 1_209_600_000_000),
+                "redemptionAmount": str(self._random.randint(1, 10 ** 20)),
+                "redemptionDenom": f"share{index % max(1, self.scale.insurance_funds)}",
+                "requestedAt": str(requested_at),
+                "disbursedAmount": str(self._random.randint(1, 10 ** 10)) if disbursed else "",
+                "disbursedDenom": QUOTE_DENOM if disbursed else "",
+                "disbursedAt": str(requested_at + 1_209_700_000_000) if disbursed else "0",
+            })
+        return {"redemptionSchedules": schedules}
+
+    def liquidation_trade_documents(self, end_dt: datetime, days: int = 7) -> List[Dict[str, Any]]:
+        # Documents as returned by the liquidation trades pipeline, after its $project stage
+        market_ids = list(self.derivative_markets)
+        period_ms = days * 24 * 3600 * 1000
+        start_dt = end_dt - timedelta(days=days)
+        documents = []
+        for index in range(self.scale.liquidation_trades):
+            documents.append({
+                "tradeId": f"{index}_{index:x}",
+                "marketId": self._random.choice(market_ids),
+                "subaccountId": f"0x{self._random.randrange(10 ** 6):040x}{0:024x}",
+                "executedAt": start_dt + timedelta(milliseconds=period_ms * index // self.scale.liquidation_trades),
+                "tradeDirection": self._random.choice(("buy", "sell")),
+                "executionPrice": self._random.uniform(0.01, 50_000),
+                "executionQuantity": self._random.uniform(0.001, 1_000),
+                "executionMargin": 0.0,
+                "payout": self._random.uniform(0, 1_000),
+                "fee": self._random.uniform(0, 10),
+            })
+        return documents
+
+    @cached_property
+    def orderbooks(self) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+        """Orderbook snapshots per market, and the chain stream events following them.
+
+        Snapshot and stream levels are {"p": price, "q": quantity} in special chain format, like
+        `get_chain_spot_orderbook` and the chain stream return them. Every event updates a few levels of a few
+        markets, and removes some of them.
+        """
+        markets = {**self.spot_markets, **self.derivative_markets}
+        mid_ticks = {market_id: self._random.randint(1_000, 100_000) for market_id in markets}
+        snapshots = {}
+        for market_id, market in markets.items():
+            mid_tick = mid_ticks[market_id]
+            levels = self.scale.orderbook_levels
+            snapshots[market_id] = {
+                "buys": [self._special_chain_level(market, mid_tick - 1 - level, self._random.randint(1, 1_000))
+                         for level in range(levels)],
+                "sells": [self._special_chain_level(market, mid_tick + 1 + level, self._random.randint(1, 1_000))
+                          for level in range(levels)],
+            }
+
+        sequences = {market_id: 1 for market_id in markets}
+        market_ids = list(markets)
+        events = []
+        for index in range(self.scale.orderbook_updates):
+            spot_updates, derivative_updates = [], []
+            for market_id in self._random.sample(market_ids, min(5, len(market_ids))):
+                market = markets[market_id]
+                sequences[market_id] += 1
+                levels = {"buyLevels": [], "sellLevels": []}
+                for _ in range(4):
+                    is_buy = self._random.random() < 0.5
+                    offset = 1 + self._random.randrange(self.scale.orderbook_levels + 5)
+                    tick = mid_ticks[market_id] - offset if is_buy else mid_ticks[market_id] + offset
+                    quantity = 0 if self._random.random() < 0.2 else self._random.randint(1, 1_000)
+                    levels["buyLevels" if is_buy else "sellLevels"].append(
+                        self._special_chain_level(market, tick, quantity))
+                update = {"seq": str(sequences[market_id]), "orderbook": {"marketId": market_id, **levels}}
+                (spot_updates if market_id in self.spot_markets else derivative_updates).append(update)
+            events.append({
+                "blockHeight": str(index + 1),
+                "spotOrderbookUpdates": spot_updates,
+                "derivativeOrderbookUpdates": derivative_updates,
+            })
+        return snapshots, events
+
+    @staticmethod
+    def _special_chain_level(market, tick: int, quantity: int) -> Dict[str, str]:
+        return {
+            "p": str(int(market.min_price_tick_size * tick * Decimal("1e18"))),
+            "q": str(int(market.min_quantity_tick_size * quantity * Decimal("1e18"))),
+        }
+
+
+class SyntheticInjectiveQueryExecutor(WrappedInjectiveQueryExecutor):
+    """Serves `SyntheticMarketData` through the query executor interface, without network access."""
+
+    def __init__(self, data: SyntheticMarketData):
+        super().__init__(executor=None)
+        self._data = data
+
+    async def _call(self, method_name: str, *args, **kwargs):
+        if method_name == "spot_markets":
+            return self._data.spot_markets
+        if method_name == "derivative_markets":
+            return self._data.derivative_markets
+        if method_name == "tokens":
+            return self._data.tokens
+        if method_name == "chain_positions":
+            return self._data.chain_positions
+        if method_name == "get_oracle_prices":
+            return {"price": self._data.oracle_prices.get(kwargs["base_symbol"], "0")}
+        if method_name == "insurance_funds":
+            return self._data.insurance_funds
+        if method_name == "redemptions":
+            return self._data.redemptions
+        if method_name in ("get_chain_spot_orderbook", "get_chain_derivative_orderbook"):
+            return self._data.orderbooks[0][kwargs["market_id"]]
+        raise NotImplementedError(f"{method_name} has no synthetic data")
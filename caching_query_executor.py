@@ -0,0 +1,89 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Mapping, Optional, Tuple
+
+from constants import QUERY_EXECUTOR_CACHE_MAX_ENTRIES, QUERY_EXECUTOR_CACHE_TTL_SECONDS
+from injective_query_executor import (
+    STREAM_METHODS,
+    TRANSACTION_METHODS,
+    BaseInjectiveQueryExecutor,
+    WrappedInjectiveQueryExecutor,
+)
+
+CacheKey = Tuple[str, Hashable]
+
+# Chain orderbooks are aligned with the chain stream, so each call must return the state at the time it is made
+UNCACHED_METHODS = STREAM_METHODS | TRANSACTION_METHODS | {
+    "ping",
+    "get_chain_spot_orderbook",
+    "get_chain_derivative_orderbook",
+}
+
+
+def _hashable(value) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _hashable(item)) for key, item in value.items()))
+    return value
+
+
+class CachingInjectiveQueryExecutor(WrappedInjectiveQueryExecutor):
+    """Coalesces identical concurrent calls into one request and caches the responses for a per-method TTL.
+
+    The cache is a bounded LRU shared by all methods. Responses are returned as they are, so callers must not modify
+    them. Streams, transaction simulation and broadcasting, pings and chain orderbooks always go to the wrapped executor.
+    """
+
+    def __init__(self,
+                 executor: BaseInjectiveQueryExecutor,
+                 ttls: Optional[Mapping[str, float]] = None,
+                 max_entries: int = QUERY_EXECUTOR_CACHE_MAX_ENTRIES):
+        super().__init__(executor=executor)
+        self._ttls = dict(QUERY_EXECUTOR_CACHE_TTL_SECONDS if ttls is None else ttls)
+        self._max_entries = max_entries
+        self._responses: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[CacheKey, asyncio.Task] = {}
+
+    def invalidate(self, method_name: Optional[str] = None):
+        if method_name is None:
+            self._responses.clear()
+        else:
+            for cache_key in [cache_key for cache_key in self._responses if cache_key[0] == method_name]:
+                del self._responses[cache_key]
+
+    async def _call(self, method_name: str, *args, **kwargs):
+        if method_name in UNCACHED_METHODS:
+            return await super()._call(method_name, *args, **kwargs)
+
+        cache_key = (method_name, _hashable((args, kwargs)))
+        entry = self._responses.get(cache_key)
+        if entry is not None:
+            expires_at, response = entry
+            if time.monotonic() < expires_at:
+                self._responses.move_to_end(cache_key)
+                return response
+            del self._responses[cache_key]
+
+        task = self._in_flight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(super()._call(method_name, *args, **kwargs))
+            self._in_flight[cache_key] = task
+            task.add_done_callback(lambda done_task: self._store(cache_key, done_task))
+        # A caller that is cancelled does not cancel the request the other callers are waiting for
+        return await asyncio.shield(task)
+
+    def _store(self, cache_key: CacheKey, task: asyncio.Task):
+        if self._in_flight.get(cache_key) is task:
+            del self._in_flight[cache_key]
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        ttl = self._ttls.get(cache_key[0], 0)
+        if ttl <= 0 or self._max_entries <= 0:
+            return
+        self._responses[cache_key] = (time.monotonic() + ttl, task.result())
+        self._responses.move_to_end(cache_key)
+        while len(self._responses) > self._max_entries:
+            self._responses.popitem(last=False)
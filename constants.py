@@ -0,0 +1,65 @@
+ORACLE_PRICE_CACHE_TTL_SECONDS = 10
+ORACLE_PRICE_MAX_CONCURRENCY = 16
+OPEN_INTEREST_STREAM_RECONNECT_DELAY_SECONDS = 5
+MONGO_CURSOR_BATCH_SIZE = 10000
+DATA_CACHE_DIR = ".cache"
+LIQUIDATION_STORE_PATH = f"{DATA_CACHE_DIR}/liquidations"
+LIQUIDATION_STORE_SETTLE_SECONDS = 3600
+MONGO_QUERY_SHARD_DAYS = 1
+MONGO_QUERY_MAX_CONCURRENCY = 8
+LIQUIDATION_ROLLUP_STORE_PATH = f"{DATA_CACHE_DIR}/liquidation_rollups"
+MARKETS_SNAPSHOT_PATH = f"{DATA_CACHE_DIR}/markets_snapshot.pickle"
+MARKETS_SNAPSHOT_MAX_AGE_SECONDS = 3600
+PAGE_RESULT_CACHE_TTL_SECONDS = 300
+REDEMPTION_STORE_PATH = f"{DATA_CACHE_DIR}/redemptions.json"
+REDEMPTION_FULL_SYNC_INTERVAL_SECONDS = 24 * 60 * 60
+REDEMPTION_SYNC_MAX_CONCURRENCY = 8
+PAGE_LOAD_TIMEOUT_SECONDS = 60
+OPEN_INTEREST_STREAMING_ENABLED = True
+SNAPSHOT_STORE_PATH = f"{DATA_CACHE_DIR}/snapshots"
+SNAPSHOT_MAX_AGE_SECONDS = 600
+WORKER_INTERVAL_SECONDS = 60
+QUERY_EXECUTOR_INSTRUMENTATION_ENABLED = True
+QUERY_EXECUTOR_LATENCY_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_EXECUTOR_METRICS_PATH = f"{DATA_CACHE_DIR}/query_executor_metrics.prom"
+# Pickling a response to measure it costs about as much as decoding it, so only sampled calls are measured
+QUERY_EXECUTOR_MEASURE_PAYLOAD_SIZE = False
+QUERY_EXECUTOR_PAYLOAD_SAMPLE_EVERY = 100
+QUERY_EXECUTOR_CACHE_ENABLED = True
+QUERY_EXECUTOR_CACHE_MAX_ENTRIES = 1024
+# Methods without an entry are coalesced while in flight but their responses are not kept
+QUERY_EXECUTOR_CACHE_TTL_SECONDS = {
+    "spot_markets": 300,
+    "derivative_markets": 300,
+    "tokens": 3600,
+    "derivative_market": 60,
+    "get_spot_orderbook": 1,
+    "get_derivative_orderbook": 1,
+    "get_oracle_prices": ORACLE_PRICE_CACHE_TTL_SECONDS,
+    "get_funding_rates": 60,
+    "get_funding_payments": 60,
+    "get_tx": 3600,
+    "insurance_funds": 60,
+}
+QUERY_EXECUTOR_RESILIENCE_ENABLED = True
+QUERY_EXECUTOR_INITIAL_CONCURRENCY = 16
+QUERY_EXECUTOR_MIN_CONCURRENCY = 2
+QUERY_EXECUTOR_MAX_CONCURRENCY = 64
+QUERY_EXECUTOR_RETRY_ATTEMPTS = 3
+QUERY_EXECUTOR_RETRY_BASE_DELAY_SECONDS = 0.2
+QUERY_EXECUTOR_RETRY_MAX_DELAY_SECONDS = 5
+QUERY_EXECUTOR_HEDGED_METHODS = (
+    "derivative_market",
+    "get_spot_orderbook",
+    "get_derivative_orderbook",
+    "get_chain_spot_orderbook",
+    "get_chain_derivative_orderbook",
+    "get_oracle_prices",
+)
+QUERY_EXECUTOR_HEDGE_QUANTILE = 0.95
+RECORDING_STREAM_FLUSH_EVENTS = 100
+ORDERBOOK_STREAMING_ENABLED = True
+ORDERBOOK_STREAM_RECONNECT_DELAY_SECONDS = 5
+ORDERBOOK_SNAPSHOT_MAX_CONCURRENCY = 8
+ORDERBOOK_DEPTH_PRICE_RANGE = 0.02
+ORDERBOOK_MAX_PENDING_UPDATES = 1000
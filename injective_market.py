@@ -1,11 +1,48 @@
-from typing import Dict, Mapping, Tuple
+import asyncio
+import importlib.metadata
+import os
+import pickle
+import time
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
 from bidict import bidict
 from pyinjective.core.market import DerivativeMarket, SpotMarket
 from pyinjective.core.token import Token
 from dataclasses import dataclass
 from decimal import Decimal
+from functools import cached_property
 
-from injective_query_executor import PythonSDKInjectiveQueryExecutor
+import numpy as np
+
+from constants import MARKETS_SNAPSHOT_MAX_AGE_SECONDS, MARKETS_SNAPSHOT_PATH
+from injective_query_executor import BaseInjectiveQueryExecutor
+
+MARKETS_SNAPSHOT_VERSION = 1
+
+SPECIAL_CHAIN_FORMAT_DIVISOR = Decimal("1e18")
+UNIT_SCALER = Decimal(1)
+
+ChainValues = Union[Sequence, np.ndarray]
+ConvertedValues = Union[List[Decimal], np.ndarray]
+
+
+def _scale_values(chain_values: ChainValues, scaler: Decimal, exact: bool, divisor: Optional[Decimal] = None) -> ConvertedValues:
+    # Exact mode returns Decimals computed like the single value conversions, otherwise a float64 array
+    if exact:
+        if divisor is None:
+            return [Decimal(chain_value) * scaler for chain_value in chain_values]
+        return [Decimal(chain_value) / divisor * scaler for chain_value in chain_values]
+    float_scaler = float(scaler) if divisor is None else float(scaler / divisor)
+    return np.asarray(chain_values, dtype=np.float64) * float_scaler
+
+
+MarketsAndTokens = Tuple[
+    Dict[str, "InjectiveToken"],
+    Mapping[str, str],
+    Dict[str, "InjectiveSpotMarket"],
+    Mapping[str, str],
+    Dict[str, "InjectiveDerivativeMarket"],
+    Mapping[str, str]
+]
 
 
 @dataclass(frozen=True)
@@ -29,13 +66,25 @@ class InjectiveToken:
     def decimals(self) -> int:
         return self.native_token.decimals
 
+    @cached_property
+    def _value_scaler(self) -> Decimal:
+        return Decimal(f"1e{-self.decimals}")
+
+    @cached_property
+    def _special_value_scaler(self) -> Decimal:
+        return Decimal(f"1e{-self.decimals - 18}")
+
     def value_from_chain_format(self, chain_value: Decimal) -> Decimal:
-        scaler = Decimal(f"1e{-self.decimals}")
-        return chain_value * scaler
+        return chain_value * self._value_scaler
 
     def value_from_special_chain_format(self, chain_value: Decimal) -> Decimal:
-        scaler = Decimal(f"1e{-self.decimals - 18}")
-        return chain_value * scaler
+        return chain_value * self._special_value_scaler
+
+    def values_from_chain_format(self, chain_values: ChainValues, exact: bool = False) -> ConvertedValues:
+        return _scale_values(chain_values, scaler=self._value_scaler, exact=exact)
+
+    def values_from_special_chain_format(self, chain_values: ChainValues, exact: bool = False) -> ConvertedValues:
+        return _scale_values(chain_values, scaler=self._special_value_scaler, exact=exact)
 
 
 @dataclass(frozen=True)
@@ -51,18 +100,35 @@ class InjectiveSpotMarket:
     def quantity_from_chain_format(self, chain_quantity: Decimal) -> Decimal:
         return self.base_token.value_from_chain_format(chain_value=chain_quantity)
 
+    @cached_property
+    def _price_scaler(self) -> Decimal:
+        return Decimal(f"1e{self.base_token.decimals - self.quote_token.decimals}")
+
     def price_from_chain_format(self, chain_price: Decimal) -> Decimal:
-        scaler = Decimal(f"1e{self.base_token.decimals - self.quote_token.decimals}")
-        return chain_price * scaler
+        return chain_price * self._price_scaler
 
     def quantity_from_special_chain_format(self, chain_quantity: Decimal) -> Decimal:
-        quantity = chain_quantity / Decimal("1e18")
+        quantity = chain_quantity / SPECIAL_CHAIN_FORMAT_DIVISOR
         return self.quantity_from_chain_format(chain_quantity=quantity)
 
     def price_from_special_chain_format(self, chain_price: Decimal) -> Decimal:
-        price = chain_price / Decimal("1e18")
+        price = chain_price / SPECIAL_CHAIN_FORMAT_DIVISOR
         return self.price_from_chain_format(chain_price=price)
 
+    def quantities_from_chain_format(self, chain_quantities: ChainValues, exact: bool = False) -> ConvertedValues:
+        return self.base_token.values_from_chain_format(chain_quantities, exact=exact)
+
+    def prices_from_chain_format(self, chain_prices: ChainValues, exact: bool = False) -> ConvertedValues:
+        return _scale_values(chain_prices, scaler=self._price_scaler, exact=exact)
+
+    def quantities_from_special_chain_format(self, chain_quantities: ChainValues,
+                                             exact: bool = False) -> ConvertedValues:
+        return _scale_values(chain_quantities, scaler=self.base_token._value_scaler, exact=exact,
+                             divisor=SPECIAL_CHAIN_FORMAT_DIVISOR)
+
+    def prices_from_special_chain_format(self, chain_prices: ChainValues, exact: bool = False) -> ConvertedValues:
+        return _scale_values(chain_prices, scaler=self._price_scaler, exact=exact, divisor=SPECIAL_CHAIN_FORMAT_DIVISOR)
+
     def min_price_tick_size(self) -> Decimal:
         return self.price_from_chain_format(chain_price=self.native_market.min_price_tick_size)
 
@@ -90,21 +156,38 @@ class InjectiveDerivativeMarket:
         ticker_base, _ = self.native_market.ticker.split("/")
         return f"{ticker_base}-{self.quote_token.unique_symbol}"
 
+    @cached_property
+    def _price_scaler(self) -> Decimal:
+        return Decimal(f"1e{-self.quote_token.decimals}")
+
     def quantity_from_chain_format(self, chain_quantity: Decimal) -> Decimal:
         return chain_quantity
 
     def price_from_chain_format(self, chain_price: Decimal) -> Decimal:
-        scaler = Decimal(f"1e{-self.quote_token.decimals}")
-        return chain_price * scaler
+        return chain_price * self._price_scaler
 
     def quantity_from_special_chain_format(self, chain_quantity: Decimal) -> Decimal:
-        quantity = chain_quantity / Decimal("1e18")
+        quantity = chain_quantity / SPECIAL_CHAIN_FORMAT_DIVISOR
         return self.quantity_from_chain_format(chain_quantity=quantity)
 
     def price_from_special_chain_format(self, chain_price: Decimal) -> Decimal:
-        price = chain_price / Decimal("1e18")
+        price = chain_price / SPECIAL_CHAIN_FORMAT_DIVISOR
         return self.price_from_chain_format(chain_price=price)
 
+    def quantities_from_chain_format(self, chain_quantities: ChainValues, exact: bool = False) -> ConvertedValues:
+        # Derivative quantities are not scaled, multiplying by one keeps the Decimal exponents unchanged
+        return _scale_values(chain_quantities, scaler=UNIT_SCALER, exact=exact)
+
+    def prices_from_chain_format(self, chain_prices: ChainValues, exact: bool = False) -> ConvertedValues:
+        return _scale_values(chain_prices, scaler=self._price_scaler, exact=exact)
+
+    def quantities_from_special_chain_format(self, chain_quantities: ChainValues,
+                                             exact: bool = False) -> ConvertedValues:
+        return _scale_values(chain_quantities, scaler=UNIT_SCALER, exact=exact, divisor=SPECIAL_CHAIN_FORMAT_DIVISOR)
+
+    def prices_from_special_chain_format(self, chain_prices: ChainValues, exact: bool = False) -> ConvertedValues:
+        return _scale_values(chain_prices, scaler=self._price_scaler, exact=exact, divisor=SPECIAL_CHAIN_FORMAT_DIVISOR)
+
     def min_price_tick_size(self) -> Decimal:
         return self.price_from_chain_format(chain_price=self.native_market.min_price_tick_size)
 
@@ -128,15 +211,25 @@ class InjectiveDerivativeMarket:
 
 
 async def _get_markets_and_tokens(
-        query_executor: PythonSDKInjectiveQueryExecutor
-) -> Tuple[
-    Dict[str, InjectiveToken],
-    Mapping[str, str],
-    Dict[str, InjectiveSpotMarket],
-    Mapping[str, str],
-    Dict[str, InjectiveDerivativeMarket],
-    Mapping[str, str]
-]:
+        query_executor: BaseInjectiveQueryExecutor
+) -> MarketsAndTokens:
+    spot_markets, derivative_markets, tokens = await asyncio.gather(
+        query_executor.spot_markets(),
+        query_executor.derivative_markets(),
+        query_executor.tokens(),
+    )
+    return _parse_markets_and_tokens(
+        spot_markets=spot_markets,
+        derivative_markets=derivative_markets,
+        tokens=tokens,
+    )
+
+
+def _parse_markets_and_tokens(
+        spot_markets: Dict[str, SpotMarket],
+        derivative_markets: Dict[str, DerivativeMarket],
+        tokens: Dict[str, Token],
+) -> MarketsAndTokens:
     tokens_map = {}
     token_symbol_and_denom_map = bidict()
     spot_markets_map = {}
@@ -144,10 +237,6 @@ async def _get_markets_and_tokens(
     spot_market_id_to_trading_pair = bidict()
     derivative_market_id_to_trading_pair = bidict()
 
-    spot_markets: Dict[str, SpotMarket] = await query_executor.spot_markets()
-    derivative_markets: Dict[str, DerivativeMarket] = await query_executor.derivative_markets()
-    tokens: Dict[str, Token] = await query_executor.tokens()
-
     for unique_symbol, injective_native_token in tokens.items():
         token = InjectiveToken(
             unique_symbol=unique_symbol,
@@ -200,3 +289,69 @@ async def _get_markets_and_tokens(
         derivative_markets_map,
         derivative_market_id_to_trading_pair
     )
+
+
+def _markets_snapshot_header() -> Dict:
+    return {
+        "version": MARKETS_SNAPSHOT_VERSION,
+        "sdk_version": importlib.metadata.version("injective-py"),
+    }
+
+
+def save_markets_snapshot(markets_and_tokens: MarketsAndTokens, path: str = MARKETS_SNAPSHOT_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as snapshot_file:
+        pickle.dump(
+            {"header": _markets_snapshot_header(), "created_at": time.time(), "data": markets_and_tokens},
+            snapshot_file,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(temporary_path, path)
+
+
+def load_markets_snapshot(path: str = MARKETS_SNAPSHOT_PATH) -> Optional[Tuple[float, MarketsAndTokens]]:
+    try:
+        with open(path, "rb") as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+    except FileNotFoundError:
+        return None
+    except Exception as exception:
+        print(f"Ignoring unreadable markets snapshot {path}: {exception}")
+        return None
+
+    if snapshot.get("header") != _markets_snapshot_header():
+        return None
+    return snapshot["created_at"], snapshot["data"]
+
+
+_snapshot_refresh_task: Optional[asyncio.Task] = None
+
+
+async def _refresh_markets_snapshot(query_executor: BaseInjectiveQueryExecutor, path: str) -> MarketsAndTokens:
+    markets_and_tokens = await _get_markets_and_tokens(query_executor)
+    save_markets_snapshot(markets_and_tokens, path=path)
+    return markets_and_tokens
+
+
+async def get_markets_and_tokens(
+        query_executor: BaseInjectiveQueryExecutor,
+        snapshot_path: str = MARKETS_SNAPSHOT_PATH,
+        max_age: float = MARKETS_SNAPSHOT_MAX_AGE_SECONDS,
+        force: bool = False,
+) -> MarketsAndTokens:
+    """Returns the markets and tokens from the on-disk snapshot when there is one.
+
+    A snapshot older than `max_age` is still returned, and a refresh is started in the background. Without a
+    usable snapshot, or with `force`, the markets and tokens are fetched and the snapshot is written before returning.
+    """
+    global _snapshot_refresh_task
+
+    snapshot = None if force else load_markets_snapshot(path=snapshot_path)
+    if snapshot is None:
+        return await _refresh_markets_snapshot(query_executor, path=snapshot_path)
+
+    created_at, markets_and_tokens = snapshot
+    if time.time() - created_at > max_age and (_snapshot_refresh_task is None or _snapshot_refresh_task.done()):
+        _snapshot_refresh_task = asyncio.create_task(_refresh_markets_snapshot(query_executor, path=snapshot_path))
+    return markets_and_tokens
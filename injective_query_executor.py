@@ -39,6 +39,14 @@ class BaseInjectiveQueryExecutor(ABC):
     async def get_derivative_orderbook(self, market_id: str) -> Dict[str, Any]:  # pragma: no cover
         raise NotImplementedError
 
+    @abstractmethod
+    async def get_chain_spot_orderbook(self, market_id: str) -> Dict[str, Any]:  # pragma: no cover
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_chain_derivative_orderbook(self, market_id: str) -> Dict[str, Any]:  # pragma: no cover
+        raise NotImplementedError
+
     @abstractmethod
     async def get_tx(self, tx_hash: str) -> Dict[str, Any]:  # pragma: no cover
         raise NotImplementedError
@@ -107,7 +115,7 @@ class BaseInjectiveQueryExecutor(ABC):
             base_symbol: str,
             quote_symbol: str,
             oracle_type: str,
-            oracle_scale_factor: int,
+            oracle_scale_factor: Optional[int] = None,
     ) -> Dict[str, Any]:  # pragma: no cover
         raise NotImplementedError
 
@@ -115,6 +123,23 @@ class BaseInjectiveQueryExecutor(ABC):
     async def get_funding_payments(self, subaccount_id: str, market_id: str, limit: int) -> Dict[str, Any]:  # pragma: no cover
         raise NotImplementedError
 
+    @abstractmethod
+    async def chain_positions(self) -> Dict[str, Any]:  # pragma: no cover
+        raise NotImplementedError
+
+    @abstractmethod
+    async def insurance_funds(self) -> Dict[str, Any]:  # pragma: no cover
+        raise NotImplementedError
+
+    @abstractmethod
+    async def redemptions(
+            self,
+            address: Optional[str] = None,
+            denom: Optional[str] = None,
+            status: Optional[str] = None,
+    ) -> Dict[str, Any]:  # pragma: no cover
+        raise NotImplementedError
+
     @abstractmethod
     async def get_derivative_positions(self, subaccount_id: str, skip: int) -> Dict[str, Any]:  # pragma: no cover
         raise NotImplementedError
@@ -148,6 +173,211 @@ class BaseInjectiveQueryExecutor(ABC):
         raise NotImplementedError
 
 
+STREAM_METHODS = frozenset({"listen_transactions_updates", "listen_chain_stream_updates"})
+TRANSACTION_METHODS = frozenset({"simulate_tx", "send_tx_sync_mode"})
+
+
+class WrappedInjectiveQueryExecutor(BaseInjectiveQueryExecutor):
+    """Base for executors that add behavior around another executor.
+
+    Every method is forwarded through `_call` with the method name, so subclasses only need to override `_call`.
+    """
+
+    def __init__(self, executor: BaseInjectiveQueryExecutor):
+        super().__init__()
+        self._executor = executor
+
+    async def _call(self, method_name: str, *args, **kwargs):
+        return await getattr(self._executor, method_name)(*args, **kwargs)
+
+    async def ping(self):
+        return await self._call("ping")
+
+    async def spot_markets(self) -> Dict[str, SpotMarket]:
+        return await self._call("spot_markets")
+
+    async def derivative_markets(self) -> Dict[str, DerivativeMarket]:
+        return await self._call("derivative_markets")
+
+    async def tokens(self) -> Dict[str, Token]:
+        return await self._call("tokens")
+
+    async def derivative_market(self, market_id: str) -> Dict[str, Any]:
+        return await self._call("derivative_market", market_id=market_id)
+
+    async def get_spot_orderbook(self, market_id: str) -> Dict[str, Any]:
+        return await self._call("get_spot_orderbook", market_id=market_id)
+
+    async def get_derivative_orderbook(self, market_id: str) -> Dict[str, Any]:
+        return await self._call("get_derivative_orderbook", market_id=market_id)
+
+    async def get_chain_spot_orderbook(self, market_id: str) -> Dict[str, Any]:
+        return await self._call("get_chain_spot_orderbook", market_id=market_id)
+
+    async def get_chain_derivative_orderbook(self, market_id: str) -> Dict[str, Any]:
+        return await self._call("get_chain_derivative_orderbook", market_id=market_id)
+
+    async def get_tx(self, tx_hash: str) -> Dict[str, Any]:
+        return await self._call("get_tx", tx_hash=tx_hash)
+
+    async def account_portfolio(self, account_address: str) -> Dict[str, Any]:
+        return await self._call("account_portfolio", account_address=account_address)
+
+    async def simulate_tx(self, tx_byte: bytes) -> Dict[str, Any]:
+        return await self._call("simulate_tx", tx_byte=tx_byte)
+
+    async def send_tx_sync_mode(self, tx_byte: bytes) -> Dict[str, Any]:
+        return await self._call("send_tx_sync_mode", tx_byte=tx_byte)
+
+    async def get_spot_trades(
+            self,
+            market_ids: List[str],
+            subaccount_id: Optional[str] = None,
+            start_time: Optional[int] = None,
+            skip: Optional[int] = None,
+            limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        return await self._call(
+            "get_spot_trades",
+            market_ids=market_ids,
+            subaccount_id=subaccount_id,
+            start_time=start_time,
+            skip=skip,
+            limit=limit,
+        )
+
+    async def get_derivative_trades(
+            self,
+            market_ids: List[str],
+            subaccount_id: Optional[str] = None,
+            start_time: Optional[int] = None,
+            skip: Optional[int] = None,
+            limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        return await self._call(
+            "get_derivative_trades",
+            market_ids=market_ids,
+            subaccount_id=subaccount_id,
+            start_time=start_time,
+            skip=skip,
+            limit=limit,
+        )
+
+    async def get_historical_spot_orders(
+            self,
+            market_ids: List[str],
+            subaccount_id: str,
+            start_time: int,
+            skip: int,
+    ) -> Dict[str, Any]:
+        return await self._call(
+            "get_historical_spot_orders",
+            market_ids=market_ids,
+            subaccount_id=subaccount_id,
+            start_time=start_time,
+            skip=skip,
+        )
+
+    async def get_historical_derivative_orders(
+            self,
+            market_ids: List[str],
+            subaccount_id: str,
+            start_time: int,
+            skip: int,
+    ) -> Dict[str, Any]:
+        return await self._call(
+            "get_historical_derivative_orders",
+            market_ids=market_ids,
+            subaccount_id=subaccount_id,
+            start_time=start_time,
+            skip=skip,
+        )
+
+    async def get_funding_rates(self, market_id: str, limit: int) -> Dict[str, Any]:
+        return await self._call("get_funding_rates", market_id=market_id, limit=limit)
+
+    async def get_oracle_prices(
+            self,
+            base_symbol: str,
+            quote_symbol: str,
+            oracle_type: str,
+            oracle_scale_factor: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        return await self._call(
+            "get_oracle_prices",
+            base_symbol=base_symbol,
+            quote_symbol=quote_symbol,
+            oracle_type=oracle_type,
+            oracle_scale_factor=oracle_scale_factor,
+        )
+
+    async def get_funding_payments(self, subaccount_id: str, market_id: str, limit: int) -> Dict[str, Any]:
+        return await self._call("get_funding_payments", subaccount_id=subaccount_id, market_id=market_id, limit=limit)
+
+    async def get_derivative_positions(self, subaccount_id: str, skip: int) -> Dict[str, Any]:
+        return await self._call("get_derivative_positions", subaccount_id=subaccount_id, skip=skip)
+
+    async def chain_positions(self) -> Dict[str, Any]:
+        return await self._call("chain_positions")
+
+    async def insurance_funds(self) -> Dict[str, Any]:
+        return await self._call("insurance_funds")
+
+    async def redemptions(
+            self,
+            address: Optional[str] = None,
+            denom: Optional[str] = None,
+            status: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        return await self._call("redemptions", address=address, denom=denom, status=status)
+
+    async def listen_transactions_updates(
+        self,
+        callback: Callable,
+        on_end_callback: Callable,
+        on_status_callback: Callable,
+    ):
+        return await self._call(
+            "listen_transactions_updates",
+            callback=callback,
+            on_end_callback=on_end_callback,
+            on_status_callback=on_status_callback,
+        )
+
+    async def listen_chain_stream_updates(
+        self,
+        callback: Callable,
+        on_end_callback: Callable,
+        on_status_callback: Callable,
+        bank_balances_filter: Optional[chain_stream_query.BankBalancesFilter] = None,
+        subaccount_deposits_filter: Optional[chain_stream_query.SubaccountDepositsFilter] = None,
+        spot_trades_filter: Optional[chain_stream_query.TradesFilter] = None,
+        derivative_trades_filter: Optional[chain_stream_query.TradesFilter] = None,
+        spot_orders_filter: Optional[chain_stream_query.OrdersFilter] = None,
+        derivative_orders_filter: Optional[chain_stream_query.OrdersFilter] = None,
+        spot_orderbooks_filter: Optional[chain_stream_query.OrderbookFilter] = None,
+        derivative_orderbooks_filter: Optional[chain_stream_query.OrderbookFilter] = None,
+        positions_filter: Optional[chain_stream_query.PositionsFilter] = None,
+        oracle_price_filter: Optional[chain_stream_query.OraclePriceFilter] = None,
+    ):
+        return await self._call(
+            "listen_chain_stream_updates",
+            callback=callback,
+            on_end_callback=on_end_callback,
+            on_status_callback=on_status_callback,
+            bank_balances_filter=bank_balances_filter,
+            subaccount_deposits_filter=subaccount_deposits_filter,
+            spot_trades_filter=spot_trades_filter,
+            derivative_trades_filter=derivative_trades_filter,
+            spot_orders_filter=spot_orders_filter,
+            derivative_orders_filter=derivative_orders_filter,
+            spot_orderbooks_filter=spot_orderbooks_filter,
+            derivative_orderbooks_filter=derivative_orderbooks_filter,
+            positions_filter=positions_filter,
+            oracle_price_filter=oracle_price_filter,
+        )
+
+
 class PythonSDKInjectiveQueryExecutor(BaseInjectiveQueryExecutor):
 
     def __init__(self, sdk_client: AsyncClient):
@@ -195,6 +425,21 @@ class PythonSDKInjectiveQueryExecutor(BaseInjectiveQueryExecutor):
 
         return result
 
+    async def get_chain_spot_orderbook(self, market_id: str) -> Dict[str, Any]:  # pragma: no cover
+        # Levels are {"p": price, "q": quantity} in special chain format, like the chain stream orderbook updates
+        order_book_response = await self._sdk_client.fetch_chain_spot_orderbook(market_id=market_id)
+        return {
+            "buys": order_book_response.get("buysPriceLevel", []),
+            "sells": order_book_response.get("sellsPriceLevel", []),
+        }
+
+    async def get_chain_derivative_orderbook(self, market_id: str) -> Dict[str, Any]:  # pragma: no cover
+        order_book_response = await self._sdk_client.fetch_chain_derivative_orderbook(market_id=market_id)
+        return {
+            "buys": order_book_response.get("buysPriceLevel", []),
+            "sells": order_book_response.get("sellsPriceLevel", []),
+        }
+
     async def get_tx(self, tx_hash: str) -> Dict[str, Any]:  # pragma: no cover
         try:
             transaction_response = await self._sdk_client.fetch_tx(hash=tx_hash)
@@ -312,7 +557,7 @@ class PythonSDKInjectiveQueryExecutor(BaseInjectiveQueryExecutor):
             base_symbol: str,
             quote_symbol: str,
             oracle_type: str,
-            oracle_scale_factor: int,
+            oracle_scale_factor: Optional[int] = None,
     ) -> Dict[str, Any]:    # pragma: no cover
         response = await self._sdk_client.fetch_oracle_price(
             base_symbol=base_symbol,
@@ -322,6 +567,20 @@ class PythonSDKInjectiveQueryExecutor(BaseInjectiveQueryExecutor):
         )
         return response
 
+    async def chain_positions(self) -> Dict[str, Any]:  # pragma: no cover
+        return await self._sdk_client.fetch_chain_positions()
+
+    async def insurance_funds(self) -> Dict[str, Any]:  # pragma: no cover
+        return await self._sdk_client.fetch_insurance_funds()
+
+    async def redemptions(
+            self,
+            address: Optional[str] = None,
+            denom: Optional[str] = None,
+            status: Optional[str] = None,
+    ) -> Dict[str, Any]:  # pragma: no cover
+        return await self._sdk_client.fetch_redemptions(address=address, denom=denom, status=status)
+
     async def listen_transactions_updates(
         self,
         callback: Callable,
@@ -0,0 +1,194 @@
+import bisect
+import pickle
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from constants import (
+    QUERY_EXECUTOR_LATENCY_BUCKETS_SECONDS,
+    QUERY_EXECUTOR_MEASURE_PAYLOAD_SIZE,
+    QUERY_EXECUTOR_PAYLOAD_SAMPLE_EVERY,
+)
+from injective_query_executor import STREAM_METHODS, BaseInjectiveQueryExecutor, WrappedInjectiveQueryExecutor
+
+METRICS_PREFIX = "market_monitor_query_executor"
+
+
+@dataclass(frozen=True)
+class MethodMetricsSnapshot:
+    method: str
+    calls: int
+    errors: int
+    p50_seconds: Optional[float]
+    p95_seconds: Optional[float]
+    p99_seconds: Optional[float]
+    mean_seconds: Optional[float]
+    mean_payload_bytes: Optional[float]
+
+
+class MethodMetrics:
+    """Call count, error count, latency histogram and payload sizes of one executor method."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.calls = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.payload_count = 0
+        self.payload_bytes = 0
+
+    def observe(self, latency: float, error: bool, payload_bytes: Optional[int]):
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.latency_sum += latency
+        self.bucket_counts[bisect.bisect_left(self.buckets, latency)] += 1
+        if payload_bytes is not None:
+            self.payload_count += 1
+            self.payload_bytes += payload_bytes
+
+    def quantile(self, quantile: float) -> Optional[float]:
+        # Linear interpolation inside the bucket holding the quantile, like Prometheus' histogram_quantile
+        if self.calls == 0:
+            return None
+        rank = quantile * self.calls
+        cumulative_count = 0
+        for index, count in enumerate(self.bucket_counts):
+            if cumulative_count + count >= rank and count > 0:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower_bound = self.buckets[index - 1] if index > 0 else 0.0
+                upper_bound = self.buckets[index]
+                return lower_bound + (upper_bound - lower_bound) * (rank - cumulative_count) / count
+            cumulative_count += count
+        return self.buckets[-1]
+
+
+class QueryExecutorMetrics:
+    """Per-method metrics of an instrumented executor, readable from any thread."""
+
+    def __init__(self, buckets: Tuple[float, ...] = QUERY_EXECUTOR_LATENCY_BUCKETS_SECONDS):
+        self._buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._methods: Dict[str, MethodMetrics] = {}
+
+    def observe(self, method_name: str, latency: float, error: bool, payload_bytes: Optional[int] = None):
+        with self._lock:
+            method_metrics = self._methods.get(method_name)
+            if method_metrics is None:
+                method_metrics = MethodMetrics(self._buckets)
+                self._methods[method_name] = method_metrics
+            method_metrics.observe(latency=latency, error=error, payload_bytes=payload_bytes)
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+
+    def snapshot(self) -> List[MethodMetricsSnapshot]:
+        with self._lock:
+            return [
+                MethodMetricsSnapshot(
+                    method=method_name,
+                    calls=method_metrics.calls,
+                    errors=method_metrics.errors,
+                    p50_seconds=method_metrics.quantile(0.5),
+                    p95_seconds=method_metrics.quantile(0.95),
+                    p99_seconds=method_metrics.quantile(0.99),
+                    mean_seconds=method_metrics.latency_sum / method_metrics.calls if method_metrics.calls else None,
+                    mean_payload_bytes=(method_metrics.payload_bytes / method_metrics.payload_count
+                                        if method_metrics.payload_count else None),
+                )
+                for method_name, method_metrics in sorted(self._methods.items())
+            ]
+
+    def prometheus_text(self) -> str:
+        lines = [
+            f"# HELP {METRICS_PREFIX}_calls_total Calls made through the query executor.",
+            f"# TYPE {METRICS_PREFIX}_calls_total counter",
+        ]
+        with self._lock:
+            methods = sorted(self._methods.items())
+            for method_name, method_metrics in methods:
+                lines.append(f'{METRICS_PREFIX}_calls_total{{method="{method_name}"}} {method_metrics.calls}')
+
+            lines.append(f"# HELP {METRICS_PREFIX}_errors_total Calls that raised an exception.")
+            lines.append(f"# TYPE {METRICS_PREFIX}_errors_total counter")
+            for method_name, method_metrics in methods:
+                lines.append(f'{METRICS_PREFIX}_errors_total{{method="{method_name}"}} {method_metrics.errors}')
+
+            lines.append(f"# HELP {METRICS_PREFIX}_latency_seconds Latency of the calls.")
+            lines.append(f"# TYPE {METRICS_PREFIX}_latency_seconds histogram")
+            for method_name, method_metrics in methods:
+                cumulative_count = 0
+                for upper_bound, count in zip(method_metrics.buckets, method_metrics.bucket_counts):
+                    cumulative_count += count
+                    lines.append(f'{METRICS_PREFIX}_latency_seconds_bucket{{method="{method_name}",le="{upper_bound}"}} '
+                                 f'{cumulative_count}')
+                lines.append(f'{METRICS_PREFIX}_latency_seconds_bucket{{method="{method_name}",le="+Inf"}} '
+                             f'{method_metrics.calls}')
+                lines.append(f'{METRICS_PREFIX}_latency_seconds_sum{{method="{method_name}"}} '
+                             f'{method_metrics.latency_sum}')
+                lines.append(f'{METRICS_PREFIX}_latency_seconds_count{{method="{method_name}"}} '
+                             f'{method_metrics.calls}')
+
+            lines.append(f"# HELP {METRICS_PREFIX}_payload_bytes Pickled size of the sampled responses.")
+            lines.append(f"# TYPE {METRICS_PREFIX}_payload_bytes summary")
+            for method_name, method_metrics in methods:
+                lines.append(f'{METRICS_PREFIX}_payload_bytes_sum{{method="{method_name}"}} '
+                             f'{method_metrics.payload_bytes}')
+                lines.append(f'{METRICS_PREFIX}_payload_bytes_count{{method="{method_name}"}} '
+                             f'{method_metrics.payload_count}')
+        return "\n".join(lines) + "\n"
+
+
+def _payload_size(response) -> Optional[int]:
+    try:
+        return len(pickle.dumps(response, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return None
+
+
+class InstrumentedInjectiveQueryExecutor(WrappedInjectiveQueryExecutor):
+    """Records the latency and errors of every call made to the wrapped executor.
+
+    Streams are forwarded without being measured, since they only return when the stream ends. When `enabled` is
+    False the calls are forwarded directly. With `measure_payload_size`, the first call of each method and then one
+    call every `payload_sample_every` is also measured by pickling its response.
+    """
+
+    def __init__(self,
+                 executor: BaseInjectiveQueryExecutor,
+                 metrics: Optional[QueryExecutorMetrics] = None,
+                 measure_payload_size: bool = QUERY_EXECUTOR_MEASURE_PAYLOAD_SIZE,
+                 payload_sample_every: int = QUERY_EXECUTOR_PAYLOAD_SAMPLE_EVERY,
+                 enabled: bool = True):
+        super().__init__(executor=executor)
+        self.metrics = metrics or QueryExecutorMetrics()
+        self.enabled = enabled
+        self._measure_payload_size = measure_payload_size
+        self._payload_sample_every = max(1, payload_sample_every)
+        self._calls_since_payload_sample: Dict[str, int] = {}
+
+    async def _call(self, method_name: str, *args, **kwargs):
+        if not self.enabled or method_name in STREAM_METHODS:
+            return await super()._call(method_name, *args, **kwargs)
+
+        started_at = time.perf_counter()
+        try:
+            response = await super()._call(method_name, *args, **kwargs)
+        except Exception:
+            self.metrics.observe(method_name, latency=time.perf_counter() - started_at, error=True)
+            raise
+        latency = time.perf_counter() - started_at
+        payload_bytes = _payload_size(response) if self._should_sample_payload(method_name) else None
+        self.metrics.observe(method_name, latency=latency, error=False, payload_bytes=payload_bytes)
+        return response
+
+    def _should_sample_payload(self, method_name: str) -> bool:
+        if not self._measure_payload_size:
+            return False
+        calls = self._calls_since_payload_sample.get(method_name, 0)
+        self._calls_since_payload_sample[method_name] = (calls + 1) % self._payload_sample_every
+        return calls == 0
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from constants import (
+    LIQUIDATION_ROLLUP_STORE_PATH,
+    LIQUIDATION_STORE_PATH,
+    LIQUIDATION_STORE_SETTLE_SECONDS,
+    MONGO_CURSOR_BATCH_SIZE,
+    MONGO_QUERY_MAX_CONCURRENCY,
+)
+from liquidations import (
+    LIQUIDATION_ROLLUP_SCHEMA,
+    LIQUIDATION_ROLLUP_UNITS,
+    LIQUIDATION_TRADE_SCHEMA,
+    _liquidation_trades_window,
+    query_liquidation_rollups,
+    stream_liquidation_trades,
+)
+from mongodb import MongoSettings
+
+
+class LiquidationStore:
+    """Local Parquet copy of the liquidation trades, partitioned by day and market.
+
+    Every day partition records the `executedAt` high-watermark of the trades already stored, saved after each part
+    file is written, so a sync only asks Mongo for the trades executed since it. Trades at the watermark (or written
+    just before an interrupted sync saved it) are fetched again and skipped by `tradeId`. Days that ended more than
+    `settle_seconds` ago are marked complete once synced and are never queried again.
+    """
+
+    WATERMARKS_FILE = "_watermarks.json"
+
+    def __init__(self,
+                 root: str = LIQUIDATION_STORE_PATH,
+                 settle_seconds: float = LIQUIDATION_STORE_SETTLE_SECONDS,
+                 batch_size: int = MONGO_CURSOR_BATCH_SIZE,
+                 max_concurrency: int = MONGO_QUERY_MAX_CONCURRENCY,
+                 clock: Callable[[], datetime] = datetime.now,
+                 mongo_settings: Optional[MongoSettings] = None):
+        self._root = root
+        self._settle_seconds = settle_seconds
+        self._batch_size = batch_size
+        self._max_concurrency = max_concurrency
+        self._clock = clock
+        self._mongo_settings = mongo_settings
+        self._watermarks: Dict[str, Dict] = self._load_watermarks()
+
+    def now(self) -> datetime:
+        return self._clock()
+
+    async def sync(self, start_dt: datetime, end_dt: datetime):
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def sync_day(day: date):
+            async with semaphore:
+                await self.sync_day(day)
+
+        await asyncio.gather(*[
+            sync_day(day) for day in self._days_between(start_dt, end_dt) if not self._is_complete(day)
+        ])
+
+    async def sync_day(self, day: date):
+        day_key = day.isoformat()
+        day_start, day_end = self._day_bounds(day)
+        sync_started_at = self.now()
+
+        watermark = self._watermark(day)
+        stored_trade_ids = self.read(start_dt=watermark or day_start, end_dt=day_end).column("tradeId")
+        stored_trade_ids = stored_trade_ids.combine_chunks()
+        async for batch in stream_liquidation_trades(start_dt=day_start,
+                                                     end_dt=day_end,
+                                                     executed_since=watermark,
+                                                     batch_size=self._batch_size,
+                                                     settings=self._mongo_settings):
+            if len(stored_trade_ids):
+                batch = batch.filter(pc.invert(pc.is_in(batch.column("tradeId"), value_set=stored_trade_ids)))
+            if batch.num_rows == 0:
+                continue
+            self._write_batch(day=day, batch=batch)
+            batch_watermark = pc.max(batch.column("executedAt")).as_py()
+            if batch_watermark is not None and (watermark is None or batch_watermark > watermark):
+                watermark = batch_watermark
+            self._save_watermark(day_key, watermark=watermark, complete=False)
+
+        complete = (sync_started_at - day_end).total_seconds() > self._settle_seconds
+        self._save_watermark(day_key, watermark=watermark, complete=complete)
+
+    def read(self, start_dt: datetime, end_dt: datetime, market_id: Optional[str] = None) -> pa.Table:
+        paths = []
+        for day in self._days_between(start_dt, end_dt):
+            day_directory = self._day_directory(day)
+            if market_id:
+                market_directories = [os.path.join(day_directory, f"market_id={market_id}")]
+            elif os.path.isdir(day_directory):
+                market_directories = [entry.path for entry in os.scandir(day_directory) if entry.is_dir()]
+            else:
+                market_directories = []
+            for market_directory in market_directories:
+                if os.path.isdir(market_directory):
+                    paths.extend(entry.path for entry in os.scandir(market_directory)
+                                 if entry.name.endswith(".parquet"))
+
+        if not paths:
+            return LIQUIDATION_TRADE_SCHEMA.empty_table()
+
+        dataset = ds.dataset(paths, format="parquet", schema=LIQUIDATION_TRADE_SCHEMA)
+        executed_at = ds.field("executedAt")
+        return dataset.to_table(filter=(executed_at >= pa.scalar(start_dt, type=pa.timestamp("ms"))) &
+                                       (executed_at <= pa.scalar(end_dt, type=pa.timestamp("ms"))))
+
+    def _write_batch(self, day: date, batch: pa.RecordBatch):
+        table = pa.Table.from_batches([batch])
+        market_id_column = table.column("marketId").cast(pa.string())
+        file_name = f"part-{time.time_ns()}.parquet"
+        for market_id in pc.unique(market_id_column).to_pylist():
+            market_table = table.filter(pc.equal(market_id_column, market_id))
+            market_directory = os.path.join(self._day_directory(day), f"market_id={market_id}")
+            os.makedirs(market_directory, exist_ok=True)
+            temporary_path = os.path.join(market_directory, f".{file_name}.tmp")
+            pq.write_table(market_table, temporary_path)
+            os.replace(temporary_path, os.path.join(market_directory, file_name))
+
+    def _day_directory(self, day: date) -> str:
+        return os.path.join(self._root, f"day={day.isoformat()}")
+
+    def _watermark(self, day: date) -> Optional[datetime]:
+        watermark = self._watermarks.get(day.isoformat(), {}).get("executedAt")
+        return datetime.fromisoformat(watermark) if watermark else None
+
+    def _is_complete(self, day: date) -> bool:
+        return self._watermarks.get(day.isoformat(), {}).get("complete", False)
+
+    def _load_watermarks(self) -> Dict[str, Dict]:
+        path = os.path.join(self._root, self.WATERMARKS_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as watermarks_file:
+            return json.load(watermarks_file)
+
+    def _save_watermark(self, day_key: str, watermark: Optional[datetime], complete: bool):
+        self._watermarks[day_key] = {
+            "executedAt": watermark.isoformat() if watermark is not None else None,
+            "complete": complete,
+        }
+        self._save_watermarks()
+
+    def _save_watermarks(self):
+        os.makedirs(self._root, exist_ok=True)
+        path = os.path.join(self._root, self.WATERMARKS_FILE)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as watermarks_file:
+            json.dump(self._watermarks, watermarks_file, indent=1, sort_keys=True)
+        os.replace(temporary_path, path)
+
+    @staticmethod
+    def _day_bounds(day: date) -> Tuple[datetime, datetime]:
+        day_start = datetime(day.year, day.month, day.day)
+        return day_start, day_start + timedelta(days=1) - timedelta(microseconds=1)
+
+    @staticmethod
+    def _days_between(start_dt: datetime, end_dt: datetime) -> List[date]:
+        days = []
+        day = start_dt.date()
+        while day <= end_dt.date():
+            days.append(day)
+            day += timedelta(days=1)
+        return days
+
+
+class LiquidationRollupStore:
+    """Materialized liquidation rollups computed by the Mongo `$group` pipeline.
+
+    Buckets that closed more than `settle_seconds` ago are persisted in one Parquet file per bucket size, together
+    with the contiguous time range they cover. Only the buckets outside that range are requested from the server.
+    """
+
+    BUCKET_REFERENCE = datetime(2000, 1, 1)
+
+    def __init__(self,
+                 root: str = LIQUIDATION_ROLLUP_STORE_PATH,
+                 settle_seconds: float = LIQUIDATION_STORE_SETTLE_SECONDS,
+                 clock: Callable[[], datetime] = datetime.now,
+                 mongo_settings: Optional[MongoSettings] = None):
+        self._root = root
+        self._settle_seconds = settle_seconds
+        self._clock = clock
+        self._mongo_settings = mongo_settings
+
+    def now(self) -> datetime:
+        return self._clock()
+
+    async def get(self, start_dt: datetime, end_dt: datetime, unit: str = "hour", bin_size: int = 1,
+                  market_id: Optional[str] = None) -> pa.Table:
+        bucket_size = LIQUIDATION_ROLLUP_UNITS[unit] * bin_size
+        start_dt = self._floor_to_bucket(start_dt, bucket_size)
+        materialized, covered_from, closed_until = self._load(unit=unit, bin_size=bin_size)
+
+        closed_boundary = min(
+            self._floor_to_bucket(self.now() - timedelta(seconds=self._settle_seconds), bucket_size),
+            self._floor_to_bucket(end_dt + timedelta(milliseconds=1), bucket_size),
+        )
+
+        # Every fetched range keeps the rows below its own closed boundary. The head range ends at `covered_from`,
+        # which is already closed, so all its rows are kept even when `end_dt` is earlier
+        fetch_ranges = []
+        if covered_from is None:
+            fetch_ranges.append((start_dt, end_dt, closed_boundary))
+        else:
+            if start_dt < covered_from:
+                fetch_ranges.append((start_dt, covered_from - timedelta(milliseconds=1), covered_from))
+            if end_dt >= closed_until:
+                fetch_ranges.append((closed_until, end_dt, closed_boundary))
+
+        fetched = [
+            (await query_liquidation_rollups(start_dt=range_start, end_dt=range_end, unit=unit, bin_size=bin_size,
+                                             settings=self._mongo_settings),
+             pa.scalar(range_closed_boundary, type=pa.timestamp("ms")))
+            for range_start, range_end, range_closed_boundary in fetch_ranges
+        ]
+        new_closed_rows = [
+            table.filter(pc.less(table.column("bucket"), range_closed_boundary))
+            for table, range_closed_boundary in fetched
+        ]
+        if fetch_ranges:
+            materialized = pa.concat_tables([materialized] + new_closed_rows)
+            covered_from = start_dt if covered_from is None else min(covered_from, start_dt)
+            closed_until = max(covered_from, closed_boundary, closed_until or covered_from)
+            self._save(materialized, covered_from=covered_from, closed_until=closed_until, unit=unit,
+                       bin_size=bin_size)
+
+        open_rows = [
+            table.filter(pc.greater_equal(table.column("bucket"), range_closed_boundary))
+            for table, range_closed_boundary in fetched
+        ]
+        rollups = pa.concat_tables([materialized] + open_rows)
+        rollups = rollups.filter(
+            pc.and_(pc.greater_equal(rollups.column("bucket"), pa.scalar(start_dt, type=pa.timestamp("ms"))),
+                    pc.less_equal(rollups.column("bucket"), pa.scalar(end_dt, type=pa.timestamp("ms")))))
+        if market_id:
+            rollups = rollups.filter(pc.equal(rollups.column("marketId"), market_id))
+        return rollups.sort_by([("bucket", "ascending"), ("marketId", "ascending")])
+
+    def _path(self, unit: str, bin_size: int) -> str:
+        return os.path.join(self._root, f"{unit}_{bin_size}.parquet")
+
+    def _load(self, unit: str, bin_size: int):
+        path = self._path(unit=unit, bin_size=bin_size)
+        if not os.path.exists(path):
+            return LIQUIDATION_ROLLUP_SCHEMA.empty_table(), None, None
+        table = pq.read_table(path, schema=LIQUIDATION_ROLLUP_SCHEMA)
+        metadata = pq.read_schema(path).metadata or {}
+        covered_from = datetime.fromisoformat(metadata[b"covered_from"].decode())
+        closed_until = datetime.fromisoformat(metadata[b"closed_until"].decode())
+        return table, covered_from, closed_until
+
+    def _save(self, table: pa.Table, covered_from: datetime, closed_until: datetime, unit: str, bin_size: int):
+        os.makedirs(self._root, exist_ok=True)
+        table = table.replace_schema_metadata({
+            "covered_from": covered_from.isoformat(),
+            "closed_until": closed_until.isoformat(),
+        })
+        path = self._path(unit=unit, bin_size=bin_size)
+        temporary_path = f"{path}.tmp"
+        pq.write_table(table, temporary_path)
+        os.replace(temporary_path, path)
+
+    def _floor_to_bucket(self, timestamp: datetime, bucket_size: timedelta) -> datetime:
+        return self.BUCKET_REFERENCE + ((timestamp - self.BUCKET_REFERENCE) // bucket_size) * bucket_size
+
+
+_liquidation_store: Optional[LiquidationStore] = None
+_liquidation_rollup_store: Optional[LiquidationRollupStore] = None
+
+
+def get_liquidation_store() -> LiquidationStore:
+    global _liquidation_store
+    if _liquidation_store is None:
+        _liquidation_store = LiquidationStore()
+    return _liquidation_store
+
+
+async def get_stored_liquidation_trades(days=None, market_id=None, store: Optional[LiquidationStore] = None) -> pa.Table:
+    store = store or get_liquidation_store()
+    start_dt, end_dt = _liquidation_trades_window(days=days, now=store.now())
+    await store.sync(start_dt=start_dt, end_dt=end_dt)
+    return store.read(start_dt=start_dt, end_dt=end_dt, market_id=market_id)
+
+
+def get_liquidation_rollup_store() -> LiquidationRollupStore:
+    global _liquidation_rollup_store
+    if _liquidation_rollup_store is None:
+        _liquidation_rollup_store = LiquidationRollupStore()
+    return _liquidation_rollup_store
+
+
+async def get_stored_liquidation_rollups(days=None, market_id=None, unit="hour", bin_size=1,
+                                         store: Optional[LiquidationRollupStore] = None) -> pa.Table:
+    store = store or get_liquidation_rollup_store()
+    start_dt, end_dt = _liquidation_trades_window(days=days, now=store.now())
+    return await store.get(start_dt=start_dt, end_dt=end_dt, unit=unit, bin_size=bin_size, market_id=market_id)
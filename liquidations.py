@@ -1,60 +1,103 @@
-import streamlit as st
+import numpy as np
 import pandas as pd
-import asyncio
+import pyarrow as pa
 from datetime import datetime, timedelta
-from pyinjective.async_client import AsyncClient
-from pyinjective.core.network import Network
-
-from injective_market import _get_markets_and_tokens
-from injective_query_executor import PythonSDKInjectiveQueryExecutor
-from mongodb import query_mongodb
-
-
-def _scale_balance(row, tokens_map):
-    if row['depositDenom'] != "":
-        decimals = getattr(tokens_map.get(row['depositDenom'], {}), "decimals", 0)
-        return float(row['balance']) / 10 ** decimals
-    return 0
-
-
-def _scale_disbursed(row, tokens_map):
-    if row['disbursedAmount'] != "":
-        decimals = getattr(tokens_map.get(row['disbursedDenom'], {}), "decimals", 0)
-        return float(row['disbursedAmount']) / 10 ** decimals
-    return 0
-
-
-def _transform_ts(ts):
-    if ts:
-        ts_seconds = int(ts) / 1e6
-        dt = datetime.fromtimestamp(ts_seconds)
-        return dt.strftime("%a %b %d %Y %H:%M:%S GMT%z")
-    return 0
-
-
-async def get_insurance_funds(client: AsyncClient):
-    insurance_funds = await client.fetch_insurance_funds()
+from decimal import Decimal
+from typing import TYPE_CHECKING, Optional
+
+from constants import MONGO_CURSOR_BATCH_SIZE, MONGO_QUERY_MAX_CONCURRENCY, MONGO_QUERY_SHARD_DAYS
+from mongodb import MongoSettings, gather_time_shards, query_mongodb, query_mongodb_sharded, stream_mongodb
+from redemption_store import RedemptionStore, get_redemption_store
+
+if TYPE_CHECKING:  # pragma: no cover
+    from injective_query_executor import BaseInjectiveQueryExecutor
+
+LIQUIDATION_TRADE_PROJECTION = {
+    "_id": 0,
+    "tradeId": 1,
+    "marketId": 1,
+    "subaccountId": 1,
+    "executedAt": 1,
+    "tradeDirection": "$positionDelta.tradeDirection",
+    "executionPrice": {"$toDouble": "$positionDelta.executionPrice"},
+    "executionQuantity": {"$toDouble": "$positionDelta.executionQuantity"},
+    "executionMargin": {"$toDouble": "$positionDelta.executionMargin"},
+    "payout": {"$toDouble": "$payout"},
+    "fee": {"$toDouble": "$fee"},
+}
+
+LIQUIDATION_TRADE_SCHEMA = pa.schema([
+    ("tradeId", pa.string()),
+    ("marketId", pa.dictionary(pa.int32(), pa.string())),
+    ("subaccountId", pa.string()),
+    ("executedAt", pa.timestamp("ms")),
+    ("tradeDirection", pa.dictionary(pa.int8(), pa.string())),
+    ("executionPrice", pa.float64()),
+    ("executionQuantity", pa.float64()),
+    ("executionMargin", pa.float64()),
+    ("payout", pa.float64()),
+    ("fee", pa.float64()),
+])
+
+LIQUIDATION_ROLLUP_UNITS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+LIQUIDATION_ROLLUP_SCHEMA = pa.schema([
+    ("bucket", pa.timestamp("ms")),
+    ("marketId", pa.string()),
+    ("count", pa.int64()),
+    ("notional", pa.float64()),
+    ("quantity", pa.float64()),
+])
+
+
+def _token_decimals(denoms: pd.Series, tokens_map) -> pd.Series:
+    denom_decimals = {denom: getattr(tokens_map.get(denom), "decimals", 0) for denom in denoms.unique()}
+    return denoms.map(denom_decimals).fillna(0).astype("int64")
+
+
+def scale_token_amounts(amounts: pd.Series, denoms: pd.Series, tokens_map, exact=False) -> pd.Series:
+    # Amounts are divided by 10^decimals of their denom. Empty amounts or denoms scale to 0
+    empty = amounts.isna() | (amounts == "") | denoms.isna() | (denoms == "")
+    decimals = _token_decimals(denoms.fillna(""), tokens_map)
+    if exact:
+        return pd.Series(
+            [Decimal(0) if is_empty else Decimal(amount).scaleb(-decimal_places)
+             for amount, decimal_places, is_empty in zip(amounts, decimals, empty)],
+            index=amounts.index,
+            dtype=object,
+        )
+
+    values = pd.to_numeric(amounts.where(~empty, None), errors="coerce")
+    scaled = values * np.power(10.0, -decimals.to_numpy(dtype="float64"))
+    return scaled.where(~empty, 0.0).fillna(0.0)
+
+
+async def get_insurance_funds(query_executor: "BaseInjectiveQueryExecutor"):
+    insurance_funds = await query_executor.insurance_funds()
     return insurance_funds
 
 
-async def get_redemptions(client: AsyncClient):
-    # redeemer = "inj14au322k9munkmx5wrchz9q30juf5wjgz2cfqku"
-    # redemption_denom = "share4"
-    # status = "disbursed"
-    redeemer = None
-    redemption_denom = None
-    status = None
-    insurance_redemptions = await client.fetch_redemptions(address=redeemer,
-                                                           denom=redemption_denom,
-                                                           status=status)
-    return insurance_redemptions
+async def get_redemptions(query_executor: "BaseInjectiveQueryExecutor", store: Optional[RedemptionStore] = None):
+    store = store or get_redemption_store()
+    await store.sync(query_executor)
+    return {'redemptionSchedules': store.redemption_schedules()}
 
 
-async def get_liquidation_trades(days=None, market_id=None):
+def _liquidation_trades_window(days=None, now=None):
     days = days or 1
-    today = datetime.now()
+    today = now or datetime.now()
     end_dt = datetime(today.year, today.month, today.day, 23, 59, 59)
     start_dt = datetime(today.year, today.month, today.day, 0, 0, 0) - timedelta(days=days)
+    return start_dt, end_dt
+
+
+def _liquidation_trades_match(start_dt, end_dt, market_id=None, executed_since=None):
+    if executed_since is not None:
+        start_dt = max(start_dt, executed_since)
     executed_at_block = {"executedAt": {
         "$gte": start_dt,
         "$lte": end_dt
@@ -64,17 +107,131 @@ async def get_liquidation_trades(days=None, market_id=None):
     if market_id:
         market_id_block = {"marketId": market_id}
 
-    pipeline = [
-        {
-            "$match": dict(
-                list({"isLiquidation": True}.items()) +
-                list(executed_at_block.items()) +
-                list(market_id_block.items()))
-        },  # replace with your match condition
-        # {"$project": {}},  # replace with your project condition
-        # {"$unwind": ""},  # replace with your unwind condition
-        # {"$set": {}},  # replace with your set condition
-        # {"$project": {}},  # replace with your project condition
+    return {
+        "$match": dict(
+            list({"isLiquidation": True}.items()) +
+            list(executed_at_block.items()) +
+            list(market_id_block.items()))
+    }
+
+
+async def get_liquidation_trades(days=None,
+                                 market_id=None,
+                                 shard_size=timedelta(days=MONGO_QUERY_SHARD_DAYS),
+                                 max_concurrency=MONGO_QUERY_MAX_CONCURRENCY):
+    start_dt, end_dt = _liquidation_trades_window(days=days)
+
+    def pipeline_for_range(shard_start, shard_end):
+        return [
+            _liquidation_trades_match(start_dt=shard_start, end_dt=shard_end, market_id=market_id),  # replace with your match condition
+            # {"$project": {}},  # replace with your project condition
+            # {"$unwind": ""},  # replace with your unwind condition
+            # {"$set": {}},  # replace with your set condition
+            # {"$project": {}},  # replace with your project condition
+        ]
+
+    return await query_mongodb_sharded(pipeline_for_range=pipeline_for_range,
+                                       start_dt=start_dt,
+                                       end_dt=end_dt,
+                                       shard_size=shard_size,
+                                       max_concurrency=max_concurrency)
+
+
+def _liquidation_trades_pipeline(start_dt, end_dt, market_id=None, executed_since=None):
+    return [
+        _liquidation_trades_match(start_dt=start_dt, end_dt=end_dt, market_id=market_id,
+                                  executed_since=executed_since),
+        {"$sort": {"executedAt": 1}},
+        {"$project": LIQUIDATION_TRADE_PROJECTION},
     ]
 
-    return await query_mongodb(pipeline=pipeline)
+
+async def stream_liquidation_trades(days=None,
+                                    market_id=None,
+                                    batch_size=MONGO_CURSOR_BATCH_SIZE,
+                                    as_pandas=False,
+                                    start_dt=None,
+                                    end_dt=None,
+                                    executed_since=None,
+                                    settings: Optional[MongoSettings] = None):
+    if start_dt is None or end_dt is None:
+        start_dt, end_dt = _liquidation_trades_window(days=days)
+    pipeline = _liquidation_trades_pipeline(start_dt=start_dt, end_dt=end_dt, market_id=market_id,
+                                            executed_since=executed_since)
+    async for batch in stream_mongodb(pipeline=pipeline,
+                                      batch_size=batch_size,
+                                      schema=LIQUIDATION_TRADE_SCHEMA,
+                                      as_pandas=as_pandas,
+                                      settings=settings):
+        yield batch
+
+
+async def get_liquidation_trades_table(days=None,
+                                       market_id=None,
+                                       batch_size=MONGO_CURSOR_BATCH_SIZE,
+                                       shard_size=timedelta(days=MONGO_QUERY_SHARD_DAYS),
+                                       max_concurrency=MONGO_QUERY_MAX_CONCURRENCY) -> pa.Table:
+    start_dt, end_dt = _liquidation_trades_window(days=days)
+
+    async def shard_table(shard_start, shard_end):
+        batches = [batch async for batch in stream_liquidation_trades(market_id=market_id,
+                                                                      batch_size=batch_size,
+                                                                      start_dt=shard_start,
+                                                                      end_dt=shard_end)]
+        return pa.Table.from_batches(batches, schema=LIQUIDATION_TRADE_SCHEMA)
+
+    tables = await gather_time_shards(coroutine_for_range=shard_table,
+                                      start_dt=start_dt,
+                                      end_dt=end_dt,
+                                      shard_size=shard_size,
+                                      max_concurrency=max_concurrency)
+    return pa.concat_tables(tables)
+
+
+def _liquidation_rollup_pipeline(start_dt, end_dt, unit="hour", bin_size=1, market_id=None):
+    execution_quantity = {"$toDouble": "$positionDelta.executionQuantity"}
+    return [
+        _liquidation_trades_match(start_dt=start_dt, end_dt=end_dt, market_id=market_id),
+        {"$group": {
+            "_id": {
+                "marketId": "$marketId",
+                "bucket": {"$dateTrunc": {"date": "$executedAt", "unit": unit, "binSize": bin_size}},
+            },
+            "count": {"$sum": 1},
+            "notional": {"$sum": {"$multiply": [{"$toDouble": "$positionDelta.executionPrice"}, execution_quantity]}},
+            "quantity": {"$sum": execution_quantity},
+        }},
+        {"$project": {
+            "_id": 0,
+            "bucket": "$_id.bucket",
+            "marketId": "$_id.marketId",
+            "count": 1,
+            "notional": 1,
+            "quantity": 1,
+        }},
+        {"$sort": {"bucket": 1, "marketId": 1}},
+    ]
+
+
+async def query_liquidation_rollups(start_dt, end_dt, unit="hour", bin_size=1, market_id=None,
+                                    settings: Optional[MongoSettings] = None) -> pa.Table:
+    if unit not in LIQUIDATION_ROLLUP_UNITS:
+        raise ValueError(f"Unsupported rollup unit {unit} (valid units: {', '.join(LIQUIDATION_ROLLUP_UNITS)})")
+    rows = await query_mongodb(pipeline=_liquidation_rollup_pipeline(start_dt=start_dt,
+                                                                     end_dt=end_dt,
+                                                                     unit=unit,
+                                                                     bin_size=bin_size,
+                                                                     market_id=market_id),
+                               settings=settings)
+    return pa.Table.from_pylist(rows, schema=LIQUIDATION_ROLLUP_SCHEMA)
+
+
+def scale_rollup_notionals(rollups: pd.DataFrame, derivative_markets_map) -> pd.DataFrame:
+    # Rollup notionals are summed with chain format prices, the per market scaling is applied on the grouped rows
+    price_scalers = {
+        market_id: float(market.price_from_chain_format(Decimal(1)))
+        for market_id, market in derivative_markets_map.items()
+    }
+    rollups = rollups.copy()
+    rollups["notional"] = rollups["notional"] * rollups["marketId"].map(price_scalers).astype("float64")
+    return rollups
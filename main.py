@@ -1,68 +1,15 @@
-import asyncio
-from typing import Type, Dict
-
-import streamlit as st
-
-from pyinjective.async_client import AsyncClient
-from pyinjective.core.network import Network
-
-from injective_market import _get_markets_and_tokens
-from injective_query_executor import PythonSDKInjectiveQueryExecutor
-
 from datetime import datetime
-import inspect
-import pkgutil
-import importlib
-from streamlit_pages.streamlite_page import StreamlitPage
-
 
-def discover_pages() -> Dict[str, Type[StreamlitPage]]:
-    # Define the path to the streamlit_pages directory
-    path = 'streamlit_pages'
+import pandas as pd
 
-    # Initialize the dictionary
-    pages_dict = {}
-
-    # Iterate over all the Python files in the directory
-    for (_, name, _) in pkgutil.iter_modules([path]):
-        # Import the module
-        module = importlib.import_module(f'{path}.{name}')
-
-        # Iterate over all the members of the module
-        for _, member in inspect.getmembers(module):
-            # Check if the member is a class, and if it is a subclass of StreamlitPage
-            if inspect.isclass(member) and issubclass(member, StreamlitPage) and member is not StreamlitPage:
-                # Add it to the dictionary with the title as the key
-                pages_dict[member.title()] = member
+import streamlit as st
 
-    return pages_dict
+from runtime import get_runtime
 
 
 if __name__ == "__main__":
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    network = Network.mainnet()
-    client = AsyncClient(
-        network=network,
-    )
-    query_executor = PythonSDKInjectiveQueryExecutor(sdk_client=client)
-    (
-        tokens_map,
-        token_symbol_and_denom_map,
-        spot_markets_map,
-        spot_market_id_to_trading_pair,
-        derivative_markets_map,
-        derivative_market_id_to_trading_pair
-    ) = loop.run_until_complete(_get_markets_and_tokens(query_executor))
-
-    pages_classes = discover_pages()
-    pages = {title: page_class(loop=loop,
-                               client=client,
-                               token_symbol_and_denom_map=token_symbol_and_denom_map,
-                               tokens_map=tokens_map,
-                               derivative_markets_map=derivative_markets_map) for title, page_class in
-             pages_classes.items()}
-    pages_options = tuple(pages.keys())
+    runtime = get_runtime()
+    pages_options = tuple(runtime.page_specs.keys())
 
     # Create a button in the sidebar
     refresh_button = st.sidebar.button('Refresh Calculations')
@@ -74,13 +21,30 @@ if __name__ == "__main__":
         pages_options
     )
 
-    if getattr(pages[option], 'days_lookback_enabled', False):
+    page = runtime.get_page(option)
+
+    if runtime.page_specs[option].days_lookback_enabled:
         days_lookback = st.sidebar.select_slider('Days Lookback', options=[1, 7, 30, 90], value=7)
     else:
         days_lookback = None
 
     if refresh_button:
-        pages[option].refresh_page(days_lookback=days_lookback)
+        page.refresh_page(days_lookback=days_lookback)
     else:
-        pages[option].display_page(days_lookback=days_lookback)
-    last_updated_text.text(f"Updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
\ No newline at end of file
+        page.display_page(days_lookback=days_lookback)
+    loaded_at = page.last_updated()
+    updated_at = datetime.fromtimestamp(loaded_at) if loaded_at is not None else datetime.now()
+    last_updated_text.text(f"Updated: {updated_at.strftime('%Y-%m-%d %H:%M:%S')}")
+
+    if runtime.query_executor_metrics is not None:
+        with st.sidebar.expander('Query Executor Metrics'):
+            metrics_snapshot = runtime.query_executor_metrics.snapshot()
+            if metrics_snapshot:
+                st.dataframe(pd.DataFrame(metrics_snapshot).set_index('method'), use_container_width=True)
+            else:
+                st.text('No calls yet')
+
+    # Only pages that were already opened are kept warm, the others are not even imported yet
+    for title, other_page in list(runtime.pages.items()):
+        if title != option:
+            other_page.prefetch(days_lookback=days_lookback)
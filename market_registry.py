@@ -0,0 +1,199 @@
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from constants import MARKETS_SNAPSHOT_MAX_AGE_SECONDS, MARKETS_SNAPSHOT_PATH
+from injective_market import (
+    InjectiveDerivativeMarket,
+    InjectiveSpotMarket,
+    InjectiveToken,
+    MarketsAndTokens,
+    get_markets_and_tokens,
+)
+from injective_query_executor import BaseInjectiveQueryExecutor
+
+OracleKey = Tuple[str, str, str]
+InjectiveMarket = Union[InjectiveSpotMarket, InjectiveDerivativeMarket]
+
+NO_MARKET_INDEX = -1
+
+
+def oracle_key(market) -> OracleKey:
+    return market.oracle_base, market.oracle_quote, market.oracle_type
+
+
+def _frozen_groups(groups: Dict[str, List]) -> Mapping[str, Tuple]:
+    return MappingProxyType({key: tuple(values) for key, values in groups.items()})
+
+
+@dataclass(frozen=True)
+class MarketRegistry:
+    """Immutable view of the tokens and markets, indexed for O(1) lookups.
+
+    Every market (spot and derivative) also has a dense integer index, usable as a position in NumPy arrays. The
+    index space is append-only when the registry is built from a previous one: markets keep their index across
+    refreshes, new markets get the next free indexes and delisted markets keep their slot.
+    """
+
+    tokens_map: Mapping[str, InjectiveToken]
+    token_symbol_and_denom_map: Mapping[str, str]
+    spot_markets_map: Mapping[str, InjectiveSpotMarket]
+    spot_market_id_to_trading_pair: Mapping[str, str]
+    derivative_markets_map: Mapping[str, InjectiveDerivativeMarket]
+    derivative_market_id_to_trading_pair: Mapping[str, str]
+    market_ids: Tuple[str, ...]
+    version: int = 0
+    _market_index: Mapping[str, int] = field(default_factory=dict, repr=False)
+    _market_ids_index: pd.Index = field(default=None, repr=False)
+    _oracle_keys: Mapping[str, OracleKey] = field(default_factory=dict, repr=False)
+    _markets_by_base_symbol: Mapping[str, Tuple[InjectiveMarket, ...]] = field(default_factory=dict, repr=False)
+    _markets_by_quote_denom: Mapping[str, Tuple[InjectiveMarket, ...]] = field(default_factory=dict, repr=False)
+    _markets_by_oracle_key: Mapping[OracleKey, Tuple[InjectiveDerivativeMarket, ...]] = field(
+        default_factory=dict, repr=False)
+
+    @classmethod
+    def build(cls,
+              markets_and_tokens: MarketsAndTokens,
+              previous: Optional["MarketRegistry"] = None) -> "MarketRegistry":
+        (
+            tokens_map,
+            token_symbol_and_denom_map,
+            spot_markets_map,
+            spot_market_id_to_trading_pair,
+            derivative_markets_map,
+            derivative_market_id_to_trading_pair
+        ) = markets_and_tokens
+
+        market_ids = list(previous.market_ids) if previous is not None else []
+        market_index = dict(previous._market_index) if previous is not None else {}
+        for market_id in list(spot_markets_map) + list(derivative_markets_map):
+            if market_id not in market_index:
+                market_index[market_id] = len(market_ids)
+                market_ids.append(market_id)
+
+        markets_by_base_symbol: Dict[str, List[InjectiveMarket]] = {}
+        markets_by_quote_denom: Dict[str, List[InjectiveMarket]] = {}
+        for market in spot_markets_map.values():
+            markets_by_base_symbol.setdefault(market.base_token.symbol, []).append(market)
+            markets_by_quote_denom.setdefault(market.quote_token.denom, []).append(market)
+
+        oracle_keys = {}
+        markets_by_oracle_key: Dict[OracleKey, List[InjectiveDerivativeMarket]] = {}
+        for market in derivative_markets_map.values():
+            markets_by_base_symbol.setdefault(market.base_token_symbol(), []).append(market)
+            markets_by_quote_denom.setdefault(market.quote_token.denom, []).append(market)
+            key = oracle_key(market.native_market)
+            oracle_keys[market.market_id] = key
+            markets_by_oracle_key.setdefault(key, []).append(market)
+
+        return cls(
+            tokens_map=MappingProxyType(dict(tokens_map)),
+            token_symbol_and_denom_map=token_symbol_and_denom_map,
+            spot_markets_map=MappingProxyType(dict(spot_markets_map)),
+            spot_market_id_to_trading_pair=spot_market_id_to_trading_pair,
+            derivative_markets_map=MappingProxyType(dict(derivative_markets_map)),
+            derivative_market_id_to_trading_pair=derivative_market_id_to_trading_pair,
+            market_ids=tuple(market_ids),
+            version=previous.version + 1 if previous is not None else 0,
+            _market_index=MappingProxyType(market_index),
+            _market_ids_index=pd.Index(market_ids, dtype=object),
+            _oracle_keys=MappingProxyType(oracle_keys),
+            _markets_by_base_symbol=_frozen_groups(markets_by_base_symbol),
+            _markets_by_quote_denom=_frozen_groups(markets_by_quote_denom),
+            _markets_by_oracle_key=_frozen_groups(markets_by_oracle_key),
+        )
+
+    def has_same_markets(self, markets_and_tokens: MarketsAndTokens) -> bool:
+        tokens_map, _, spot_markets_map, _, derivative_markets_map, _ = markets_and_tokens
+        return (tokens_map == self.tokens_map
+                and spot_markets_map == self.spot_markets_map
+                and derivative_markets_map == self.derivative_markets_map)
+
+    def market(self, market_id: str) -> Optional[InjectiveMarket]:
+        market = self.derivative_markets_map.get(market_id)
+        if market is None:
+            market = self.spot_markets_map.get(market_id)
+        return market
+
+    def token_for_symbol(self, symbol: str) -> Optional[InjectiveToken]:
+        denom = self.token_symbol_and_denom_map.get(symbol)
+        return self.tokens_map.get(denom) if denom is not None else None
+
+    def spot_market_for_trading_pair(self, trading_pair: str) -> Optional[InjectiveSpotMarket]:
+        market_id = self.spot_market_id_to_trading_pair.inverse.get(trading_pair)
+        return self.spot_markets_map.get(market_id) if market_id is not None else None
+
+    def derivative_market_for_trading_pair(self, trading_pair: str) -> Optional[InjectiveDerivativeMarket]:
+        market_id = self.derivative_market_id_to_trading_pair.inverse.get(trading_pair)
+        return self.derivative_markets_map.get(market_id) if market_id is not None else None
+
+    def markets_for_base_symbol(self, symbol: str) -> Tuple[InjectiveMarket, ...]:
+        return self._markets_by_base_symbol.get(symbol, ())
+
+    def markets_for_quote_denom(self, denom: str) -> Tuple[InjectiveMarket, ...]:
+        return self._markets_by_quote_denom.get(denom, ())
+
+    def oracle_key(self, market_id: str) -> Optional[OracleKey]:
+        return self._oracle_keys.get(market_id)
+
+    def oracle_keys(self) -> Mapping[str, OracleKey]:
+        return self._oracle_keys
+
+    def derivative_markets_for_oracle(self, key: OracleKey) -> Tuple[InjectiveDerivativeMarket, ...]:
+        return self._markets_by_oracle_key.get(key, ())
+
+    def market_index(self, market_id: str) -> int:
+        return self._market_index.get(market_id, NO_MARKET_INDEX)
+
+    def market_indexes(self, market_ids: Union[Sequence[str], np.ndarray]) -> np.ndarray:
+        # Unknown market ids get NO_MARKET_INDEX
+        return self._market_ids_index.get_indexer(market_ids)
+
+
+class MarketRegistryHolder:
+    """Holds the current `MarketRegistry` and swaps it atomically when the markets are refreshed.
+
+    Readers take `current` once and use that registry for a whole computation, so they never see a mix of two
+    versions.
+    """
+
+    def __init__(self, registry: MarketRegistry):
+        self._registry = registry
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> MarketRegistry:
+        return self._registry
+
+    def swap(self, markets_and_tokens: MarketsAndTokens) -> MarketRegistry:
+        with self._lock:
+            if not self._registry.has_same_markets(markets_and_tokens):
+                self._registry = MarketRegistry.build(markets_and_tokens, previous=self._registry)
+            return self._registry
+
+    async def refresh(self, query_executor: BaseInjectiveQueryExecutor) -> MarketRegistry:
+        # Always fetch from the chain, the on-disk snapshot may be the same stale data the registry was built from
+        return self.swap(await get_markets_and_tokens(query_executor, force=True))
+
+    async def refresh_periodically(self,
+                                   query_executor: BaseInjectiveQueryExecutor,
+                                   interval: float = MARKETS_SNAPSHOT_MAX_AGE_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh(query_executor)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exception:
+                print(f"Markets refresh failed: {exception}")
+
+
+async def load_market_registry(query_executor: BaseInjectiveQueryExecutor,
+                               snapshot_path: str = MARKETS_SNAPSHOT_PATH) -> MarketRegistryHolder:
+    markets_and_tokens = await get_markets_and_tokens(query_executor, snapshot_path=snapshot_path)
+    return MarketRegistryHolder(MarketRegistry.build(markets_and_tokens))
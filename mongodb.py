@@ -1,5 +1,216 @@
-from sshtunnel import SSHTunnelForwarder
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
+import atexit
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+
+from constants import MONGO_CURSOR_BATCH_SIZE, MONGO_QUERY_MAX_CONCURRENCY, MONGO_QUERY_SHARD_DAYS
+
+if TYPE_CHECKING:  # pragma: no cover
+    from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+    from sshtunnel import SSHTunnelForwarder
+
+
+@dataclass(frozen=True)
+class MongoSettings:
+    ssh_host: str = '162.55.103.170'
+    ssh_port: int = 22
+    ssh_username: str = 'root'
+    ssh_key_path: str = '~/.ssh/id_rsa'
+    mongo_host: str = '127.0.0.1'
+    mongo_port: int = 27017
+    db_name: str = 'exchangeV2'
+    collection: str = 'derivative_trades'
+    server_selection_timeout_ms: int = 20000
+    max_pool_size: int = 20
+    health_check_interval: float = 30
+    record_directory: Optional[str] = None
+    replay_directory: Optional[str] = None
+    replay_latency: float = 0
+
+    @classmethod
+    def from_env(cls) -> "MongoSettings":
+        defaults = cls()
+        return cls(
+            ssh_host=os.getenv('MONGO_SSH_HOST', defaults.ssh_host),
+            ssh_port=int(os.getenv('MONGO_SSH_PORT', defaults.ssh_port)),
+            ssh_username=os.getenv('MONGO_SSH_USERNAME', defaults.ssh_username),
+            ssh_key_path=os.getenv('MONGO_SSH_KEY_PATH', defaults.ssh_key_path),
+            mongo_host=os.getenv('MONGO_HOST', defaults.mongo_host),
+            mongo_port=int(os.getenv('MONGO_PORT', defaults.mongo_port)),
+            db_name=os.getenv('MONGO_DB_NAME', defaults.db_name),
+            collection=os.getenv('MONGO_COLLECTION', defaults.collection),
+            server_selection_timeout_ms=int(
+                os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', defaults.server_selection_timeout_ms)),
+            max_pool_size=int(os.getenv('MONGO_MAX_POOL_SIZE', defaults.max_pool_size)),
+            health_check_interval=float(os.getenv('MONGO_HEALTH_CHECK_INTERVAL', defaults.health_check_interval)),
+            record_directory=os.getenv('MONGO_RECORD_DIRECTORY', defaults.record_directory),
+            replay_directory=os.getenv('MONGO_REPLAY_DIRECTORY', defaults.replay_directory),
+            replay_latency=float(os.getenv('MONGO_REPLAY_LATENCY', defaults.replay_latency)),
+        )
+
+
+class MongoConnectionPool:
+    """Long-lived SSH tunnel and Motor client shared by every Mongo query.
+
+    The tunnel is created lazily on first use and restarted when it stops being active or a health check fails.
+    Motor clients are bound to the event loop they are first used on, so one client is kept per event loop while
+    the tunnel is shared by all of them.
+    """
+
+    def __init__(self, settings: MongoSettings):
+        self._settings = settings
+        self._lock = threading.Lock()
+        self._tunnel: Optional["SSHTunnelForwarder"] = None
+        self._clients: Dict[asyncio.AbstractEventLoop, Tuple[int, "AsyncIOMotorClient"]] = {}
+        self._last_health_check: Dict[asyncio.AbstractEventLoop, float] = {}
+
+    @property
+    def settings(self) -> MongoSettings:
+        return self._settings
+
+    async def get_client(self) -> "AsyncIOMotorClient":
+        loop = asyncio.get_running_loop()
+        client = self._client_for_loop(loop)
+
+        last_health_check = self._last_health_check.get(loop, 0)
+        if time.monotonic() - last_health_check > self._settings.health_check_interval:
+            try:
+                await client.admin.command('ping')
+            except Exception as exception:
+                print(f"Mongo health check failed, reconnecting the SSH tunnel: {exception}")
+                self._reconnect(loop)
+                client = self._client_for_loop(loop)
+                await client.admin.command('ping')
+            self._last_health_check[loop] = time.monotonic()
+
+        return client
+
+    async def get_collection(self, db_name: Optional[str] = None,
+                             collection: Optional[str] = None) -> "AsyncIOMotorCollection":
+        client = await self.get_client()
+        db = client.get_database(db_name or self._settings.db_name)
+        return db.get_collection(collection or self._settings.collection)
+
+    def close(self):
+        with self._lock:
+            for _, client in self._clients.values():
+                client.close()
+            self._clients.clear()
+            self._last_health_check.clear()
+            if self._tunnel is not None:
+                self._tunnel.stop()
+                self._tunnel = None
+
+    def _client_for_loop(self, loop: asyncio.AbstractEventLoop) -> "AsyncIOMotorClient":
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        with self._lock:
+            local_port = self._ensure_tunnel()
+            for client_loop in [client_loop for client_loop in self._clients if client_loop.is_closed()]:
+                _, stale_client = self._clients.pop(client_loop)
+                self._last_health_check.pop(client_loop, None)
+                stale_client.close()
+
+            client_port, client = self._clients.get(loop, (None, None))
+            if client is None or client_port != local_port:
+                if client is not None:
+                    client.close()
+                uri = f"mongodb://localhost:{local_port}/?directConnection=true"
+                client = AsyncIOMotorClient(
+                    uri,
+                    serverSelectionTimeoutMS=self._settings.server_selection_timeout_ms,
+                    maxPoolSize=self._settings.max_pool_size,
+                )
+                self._clients[loop] = (local_port, client)
+                self._last_health_check.pop(loop, None)
+            return client
+
+    def _ensure_tunnel(self) -> int:
+        if self._tunnel is None:
+            from sshtunnel import SSHTunnelForwarder
+
+            self._tunnel = SSHTunnelForwarder(
+                (self._settings.ssh_host, self._settings.ssh_port),
+                ssh_username=self._settings.ssh_username,
+                ssh_pkey=os.path.expanduser(self._settings.ssh_key_path),
+                remote_bind_address=(self._settings.mongo_host, self._settings.mongo_port),
+                set_keepalive=30,
+            )
+            self._tunnel.start()
+        elif not self._tunnel.is_active:
+            self._tunnel.restart()
+        return self._tunnel.local_bind_port
+
+    def _reconnect(self, loop: asyncio.AbstractEventLoop):
+        with self._lock:
+            port_and_client = self._clients.pop(loop, None)
+            if port_and_client is not None:
+                port_and_client[1].close()
+            if self._tunnel is not None:
+                self._tunnel.restart()
+
+
+_pools: Dict[MongoSettings, MongoConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _create_mongo_pool(settings: MongoSettings) -> MongoConnectionPool:
+    # Recording and replaying pools expose the same get_collection and aggregate cursor API as the real one
+    if settings.replay_directory:
+        from recording import ReplayMongoConnectionPool
+        return ReplayMongoConnectionPool(settings=settings, directory=settings.replay_directory,
+                                         latency=settings.replay_latency)
+
+    pool = MongoConnectionPool(settings=settings)
+    if settings.record_directory:
+        from recording import RecordingMongoConnectionPool
+        pool = RecordingMongoConnectionPool(pool=pool, directory=settings.record_directory)
+    return pool
+
+
+def get_mongo_pool(settings: Optional[MongoSettings] = None) -> MongoConnectionPool:
+    settings = settings or MongoSettings.from_env()
+    with _pools_lock:
+        pool = _pools.get(settings)
+        if pool is None:
+            pool = _create_mongo_pool(settings=settings)
+            _pools[settings] = pool
+        return pool
+
+
+@atexit.register
+def close_mongo_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+def _settings_with_overrides(ssh_host=None,
+                             ssh_port=None,
+                             ssh_username=None,
+                             ssh_key_path=None,
+                             mongo_host=None,
+                             mongo_port=None,
+                             ) -> MongoSettings:
+    settings = MongoSettings.from_env()
+    return replace(
+        settings,
+        ssh_host=ssh_host or settings.ssh_host,
+        ssh_port=ssh_port or settings.ssh_port,
+        ssh_username=ssh_username or settings.ssh_username,
+        ssh_key_path=ssh_key_path or settings.ssh_key_path,
+        mongo_host=mongo_host or settings.mongo_host,
+        mongo_port=mongo_port or settings.mongo_port,
+    )
 
 
 async def query_mongodb(ssh_host=None,
@@ -11,34 +222,121 @@ async def query_mongodb(ssh_host=None,
                         db_name=None,
                         collection=None,
                         pipeline=None,
+                        settings: Optional[MongoSettings] = None,
                         ):
-    ssh_host = ssh_host or '162.55.103.170'
-    ssh_port = ssh_port or 22
-    ssh_username = ssh_username or 'root'
-    ssh_key_path = ssh_key_path or '~/.ssh/id_rsa'
-
-    mongo_host = mongo_host or '127.0.0.1'
-    mongo_port = mongo_port or 27017
-
-    db_name = db_name or 'exchangeV2'
-    collection = collection or 'derivative_trades'
-
-    server = SSHTunnelForwarder(
-        (ssh_host, ssh_port),
-        ssh_username=ssh_username,
-        ssh_pkey=ssh_key_path,
-        remote_bind_address=(mongo_host, mongo_port)
-    )
+    if settings is None:
+        settings = _settings_with_overrides(
+            ssh_host=ssh_host,
+            ssh_port=ssh_port,
+            ssh_username=ssh_username,
+            ssh_key_path=ssh_key_path,
+            mongo_host=mongo_host,
+            mongo_port=mongo_port,
+        )
+    pool = get_mongo_pool(settings=settings)
+    mongo_collection = await pool.get_collection(db_name=db_name, collection=collection)
 
-    server.start()
-    uri = f"mongodb://localhost:{server.local_bind_port}/?directConnection=true"
-    client = AsyncIOMotorClient(uri, serverSelectionTimeoutMS=20000)
-    db = client.get_database(db_name)
-
-    result = await db.get_collection(collection).aggregate(pipeline).to_list(10000000)
+    result = await mongo_collection.aggregate(pipeline).to_list(10000000)
     # result = await db[collection].find_one()
 
-    server.stop()
-    client.close()
-
     return result
+
+
+def _documents_to_batch(documents: List[Dict], schema: Optional[pa.Schema]) -> pa.RecordBatch:
+    if schema is None:
+        return pa.RecordBatch.from_pylist(documents)
+    return pa.RecordBatch.from_pylist(documents, schema=schema)
+
+
+async def stream_mongodb(pipeline: List[Dict],
+                         batch_size: int = MONGO_CURSOR_BATCH_SIZE,
+                         schema: Optional[pa.Schema] = None,
+                         as_pandas: bool = False,
+                         db_name: Optional[str] = None,
+                         collection: Optional[str] = None,
+                         settings: Optional[MongoSettings] = None,
+                         ) -> AsyncIterator[Union[pa.RecordBatch, pd.DataFrame]]:
+    """Runs an aggregation and yields its results in chunks of at most `batch_size` documents.
+
+    Each chunk is a pyarrow RecordBatch (or a DataFrame when `as_pandas` is set) built with `schema`, so only one
+    cursor batch of documents is held in memory at a time. Pipelines should end with a `$project` of the fields
+    present in `schema`.
+    """
+    pool = get_mongo_pool(settings=settings)
+    mongo_collection = await pool.get_collection(db_name=db_name, collection=collection)
+    cursor = mongo_collection.aggregate(pipeline, batchSize=batch_size)
+
+    try:
+        while True:
+            documents = await cursor.to_list(length=batch_size)
+            if not documents:
+                break
+            batch = _documents_to_batch(documents=documents, schema=schema)
+            yield batch.to_pandas() if as_pandas else batch
+    finally:
+        await cursor.close()
+
+
+def split_time_range(start_dt: datetime,
+                     end_dt: datetime,
+                     shard_size: timedelta = timedelta(days=MONGO_QUERY_SHARD_DAYS),
+                     ) -> List[Tuple[datetime, datetime]]:
+    shards = []
+    shard_start = start_dt
+    while shard_start <= end_dt:
+        next_shard_start = shard_start + shard_size
+        # Mongo dates have millisecond precision, so consecutive shards neither overlap nor leave gaps
+        shards.append((shard_start, min(next_shard_start - timedelta(milliseconds=1), end_dt)))
+        shard_start = next_shard_start
+    return shards
+
+
+async def gather_time_shards(coroutine_for_range: Callable[[datetime, datetime], Awaitable[Any]],
+                             start_dt: datetime,
+                             end_dt: datetime,
+                             shard_size: timedelta = timedelta(days=MONGO_QUERY_SHARD_DAYS),
+                             max_concurrency: int = MONGO_QUERY_MAX_CONCURRENCY,
+                             ) -> List[Any]:
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_shard(shard_start: datetime, shard_end: datetime):
+        async with semaphore:
+            return await coroutine_for_range(shard_start, shard_end)
+
+    return await asyncio.gather(*[
+        run_shard(shard_start, shard_end)
+        for shard_start, shard_end in split_time_range(start_dt, end_dt, shard_size=shard_size)
+    ])
+
+
+async def query_mongodb_sharded(pipeline_for_range: Callable[[datetime, datetime], List[Dict]],
+                                start_dt: datetime,
+                                end_dt: datetime,
+                                shard_size: timedelta = timedelta(days=MONGO_QUERY_SHARD_DAYS),
+                                max_concurrency: int = MONGO_QUERY_MAX_CONCURRENCY,
+                                sort_field: str = "executedAt",
+                                db_name: Optional[str] = None,
+                                collection: Optional[str] = None,
+                                settings: Optional[MongoSettings] = None,
+                                ) -> List[Dict]:
+    """Splits `[start_dt, end_dt]` into shards and runs the pipeline for each of them concurrently.
+
+    `pipeline_for_range` must build a pipeline whose first stage is the `$match` on the shard range. Each shard is
+    sorted by `sort_field` right after it, so concatenating the shards in order returns the results sorted.
+    """
+    pool = get_mongo_pool(settings=settings)
+    mongo_collection = await pool.get_collection(db_name=db_name, collection=collection)
+
+    async def query_shard(shard_start: datetime, shard_end: datetime) -> List[Dict]:
+        pipeline = pipeline_for_range(shard_start, shard_end)
+        pipeline = pipeline[:1] + [{"$sort": {sort_field: 1}}] + pipeline[1:]
+        return await mongo_collection.aggregate(pipeline).to_list(None)
+
+    shard_results = await gather_time_shards(
+        coroutine_for_range=query_shard,
+        start_dt=start_dt,
+        end_dt=end_dt,
+        shard_size=shard_size,
+        max_concurrency=max_concurrency,
+    )
+    return list(itertools.chain.from_iterable(shard_results))
@@ -1,7 +1,20 @@
+import asyncio
+import time
 from decimal import Decimal
-from typing import List, Dict
+from typing import Dict, Iterable, List, Optional, Tuple
 from dataclasses import dataclass
-from pyinjective.async_client import AsyncClient
+
+import numpy as np
+import pandas as pd
+from pyinjective.proto.injective.stream.v1beta1 import query_pb2 as chain_stream_query
+
+from constants import (
+    OPEN_INTEREST_STREAM_RECONNECT_DELAY_SECONDS,
+    ORACLE_PRICE_CACHE_TTL_SECONDS,
+    ORACLE_PRICE_MAX_CONCURRENCY,
+)
+from injective_query_executor import BaseInjectiveQueryExecutor
+from market_registry import MarketRegistry, MarketRegistryHolder, OracleKey
 
 
 @dataclass
@@ -10,22 +23,144 @@ class PositionsForMarket:
     shorts: List[Dict]
 
 
-async def get_open_interest(client: AsyncClient, derivative_markets_map):
-    positions = await client.fetch_chain_positions()
+class OraclePriceCache:
+    def __init__(self, ttl: float = ORACLE_PRICE_CACHE_TTL_SECONDS):
+        self._ttl = ttl
+        self._prices: Dict[OracleKey, Tuple[float, Decimal]] = {}
+
+    def get(self, key: OracleKey) -> Optional[Decimal]:
+        entry = self._prices.get(key)
+        if entry is None:
+            return None
+        fetched_at, price = entry
+        if time.monotonic() - fetched_at > self._ttl:
+            del self._prices[key]
+            return None
+        return price
+
+    def set(self, key: OracleKey, price: Decimal):
+        self._prices[key] = (time.monotonic(), price)
+
+    def clear(self):
+        self._prices.clear()
+
+
+_oracle_price_cache = OraclePriceCache()
+
+
+async def fetch_oracle_prices(
+        query_executor: BaseInjectiveQueryExecutor,
+        oracle_keys: Iterable[OracleKey],
+        max_concurrency: int = ORACLE_PRICE_MAX_CONCURRENCY,
+        price_cache: Optional[OraclePriceCache] = None,
+) -> Dict[OracleKey, Decimal]:
+    price_cache = price_cache if price_cache is not None else _oracle_price_cache
+    prices = {}
+    missing_keys = []
+    for key in set(oracle_keys):
+        cached_price = price_cache.get(key)
+        if cached_price is None:
+            missing_keys.append(key)
+        else:
+            prices[key] = cached_price
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch_price(key: OracleKey) -> Decimal:
+        oracle_base, oracle_quote, oracle_type = key
+        async with semaphore:
+            price = await query_executor.get_oracle_prices(
+                base_symbol=oracle_base,
+                quote_symbol=oracle_quote,
+                oracle_type=oracle_type,
+            )
+        return Decimal(price['price'])
+
+    fetched_prices = await asyncio.gather(*[fetch_price(key) for key in missing_keys])
+    for key, price in zip(missing_keys, fetched_prices):
+        price_cache.set(key, price)
+        prices[key] = price
+
+    return prices
+
+
+@dataclass
+class PositionColumns:
+    market_ids: np.ndarray
+    market_index: np.ndarray
+    is_long: np.ndarray
+    chain_quantity: np.ndarray
+
+    def __len__(self):
+        return len(self.market_index)
+
+
+def positions_to_columns(positions_state: List[Dict]) -> PositionColumns:
+    count = len(positions_state)
+    market_index, market_ids = pd.factorize(
+        np.fromiter((position['marketId'] for position in positions_state), dtype=object, count=count)
+    )
+    is_long = np.fromiter((position['position']['isLong'] for position in positions_state), dtype=bool, count=count)
+    chain_quantity = np.fromiter(
+        (position['position']['quantity'] for position in positions_state), dtype=np.float64, count=count
+    )
+    return PositionColumns(
+        market_ids=np.asarray(market_ids, dtype=object),
+        market_index=market_index,
+        is_long=is_long,
+        chain_quantity=chain_quantity,
+    )
+
+
+def aggregate_open_interest_columns(
+        columns: PositionColumns,
+        derivative_markets_map,
+        prices: Dict[str, Decimal],
+) -> Dict[str, Tuple[float, float]]:
+    market_count = len(columns.market_ids)
+    known_markets = np.zeros(market_count, dtype=bool)
+    quantity_scalers = np.zeros(market_count, dtype=np.float64)
+    market_prices = np.zeros(market_count, dtype=np.float64)
+    for index, market_id in enumerate(columns.market_ids):
+        if market_id not in prices:
+            continue
+        derivative_market = derivative_markets_map.get(market_id)
+        if not derivative_market:
+            print(f"Market not found for market_id: {market_id}")
+            continue
+        known_markets[index] = True
+        quantity_scalers[index] = derivative_market.quantities_from_special_chain_format([1])[0]
+        market_prices[index] = float(prices[market_id])
+
+    notionals = columns.chain_quantity * (quantity_scalers * market_prices)[columns.market_index]
+    long_notionals = np.bincount(
+        columns.market_index, weights=np.where(columns.is_long, notionals, 0.0), minlength=market_count
+    )
+    short_notionals = np.bincount(
+        columns.market_index, weights=np.where(columns.is_long, 0.0, notionals), minlength=market_count
+    )
+
+    open_interest = dict()
+    for index in np.flatnonzero(known_markets):
+        derivative_market = derivative_markets_map[columns.market_ids[index]]
+        open_interest[derivative_market.trading_pair()] = (
+            float(long_notionals[index]),
+            float(short_notionals[index]),
+        )
+    return open_interest
+
+
+def aggregate_open_interest_exact(
+        positions_state: List[Dict],
+        derivative_markets_map,
+        prices: Dict[str, Decimal],
+) -> Dict[str, Tuple[Decimal, Decimal]]:
     positions_for_market = dict()
     open_interest = dict()
-    derivative_markets = await client.all_derivative_markets()
-    prices = {}
-    for position in positions['state']:
+    for position in positions_state:
         market_id = position['marketId']
         if market_id not in prices:
-            market = derivative_markets.get(market_id)
-            if not market:
-                print(f"Market not found for market_id: {market_id}")
-                continue
-            price = await client.fetch_oracle_price(market.oracle_base, market.oracle_quote, market.oracle_type)
-            prices[market_id] = Decimal(price['price'])
-
+            continue
         if market_id not in positions_for_market:
             positions_for_market[market_id] = PositionsForMarket([], [])
         if position['position']['isLong']:
@@ -33,21 +168,314 @@ async def get_open_interest(client: AsyncClient, derivative_markets_map):
         else:
             positions_for_market[market_id].shorts.append(position)
 
-    def notional_from_position(position, derivative_market):
-        quantity_scaled = derivative_market.quantity_from_special_chain_format(Decimal(position['quantity']))
-        # price_scaled = derivative_market.price_from_special_chain_format(Decimal(position['entryPrice']))
-        # return quantity_scaled * price_scaled
-        return quantity_scaled * prices[derivative_market.market_id]
+    def total_notional(positions, derivative_market):
+        quantities = derivative_market.quantities_from_special_chain_format(
+            [position['position']['quantity'] for position in positions], exact=True)
+        price = prices[derivative_market.market_id]
+        return sum(quantity * price for quantity in quantities)
 
     for market_id, positions in positions_for_market.items():
         derivative_market = derivative_markets_map.get(market_id)
         if not derivative_market:
             print(f"Market not found for market_id: {market_id}")
             continue
-        total_long_notionals = sum(notional_from_position(pos['position'], derivative_market) for pos in positions.longs)
-        total_short_notionals = sum(notional_from_position(pos['position'], derivative_market) for pos in positions.shorts)
+        total_long_notionals = total_notional(positions.longs, derivative_market)
+        total_short_notionals = total_notional(positions.shorts, derivative_market)
         open_interest[derivative_market.trading_pair()] = (
             total_long_notionals,
             total_short_notionals
         )
     return open_interest
+
+
+async def get_open_interest(
+        query_executor: BaseInjectiveQueryExecutor,
+        market_registry: MarketRegistry,
+        max_concurrency: int = ORACLE_PRICE_MAX_CONCURRENCY,
+        price_cache: Optional[OraclePriceCache] = None,
+        exact: bool = False,
+):
+    positions = await query_executor.chain_positions()
+    positions_state = positions['state']
+    columns = positions_to_columns(positions_state)
+
+    market_ids = []
+    for market_id in columns.market_ids:
+        if market_registry.oracle_key(market_id) is None:
+            print(f"Market not found for market_id: {market_id}")
+            continue
+        market_ids.append(market_id)
+
+    oracle_prices = await fetch_oracle_prices(
+        query_executor=query_executor,
+        oracle_keys=[market_registry.oracle_key(market_id) for market_id in market_ids],
+        max_concurrency=max_concurrency,
+        price_cache=price_cache,
+    )
+    prices = {market_id: oracle_prices[market_registry.oracle_key(market_id)] for market_id in market_ids}
+
+    derivative_markets_map = market_registry.derivative_markets_map
+    if exact:
+        return aggregate_open_interest_exact(positions_state, derivative_markets_map, prices)
+    return aggregate_open_interest_columns(columns, derivative_markets_map, prices)
+
+
+class OpenInterestTracker:
+    """Keeps per-market open interest up to date from the chain stream.
+
+    The tracker opens `listen_chain_stream_updates` first and buffers its updates, then bootstraps from one
+    `chain_positions` snapshot and replays the updates newer than it. Long and short quantities are kept per market,
+    so every update costs O(1) and reading the aggregate costs O(markets). A gap in the stream block heights, the
+    stream ending, or a new version of the market registry triggers a resync from a new snapshot.
+    """
+
+    def __init__(
+            self,
+            query_executor: BaseInjectiveQueryExecutor,
+            market_registry: MarketRegistryHolder,
+            reconnect_delay: float = OPEN_INTEREST_STREAM_RECONNECT_DELAY_SECONDS,
+    ):
+        self._query_executor = query_executor
+        self._market_registry = market_registry
+        self._registry = market_registry.current
+        self._derivative_markets_map = self._registry.derivative_markets_map
+        self._reconnect_delay = reconnect_delay
+
+        self._oracle_keys: Dict[str, OracleKey] = {}
+        self._positions: Dict[Tuple[str, str], Tuple[bool, Decimal]] = {}
+        self._long_quantities: Dict[str, Decimal] = {}
+        self._short_quantities: Dict[str, Decimal] = {}
+        self._prices: Dict[str, Decimal] = {}
+        self._oracle_symbol_prices: Dict[Tuple[str, str], Decimal] = {}
+        self._markets_for_oracle_symbol: Dict[Tuple[str, str], List[str]] = {}
+
+        self._last_block_height: Optional[int] = None
+        self._synced = asyncio.Event()
+        self._stream_delivering = asyncio.Event()
+        self._pending_updates: List[Dict] = []
+        self._stream_task: Optional[asyncio.Task] = None
+        self._resync_task: Optional[asyncio.Task] = None
+        self._restart_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_synced(self) -> bool:
+        return self._synced.is_set()
+
+    async def wait_until_synced(self, timeout: Optional[float] = None):
+        await asyncio.wait_for(self._synced.wait(), timeout=timeout)
+
+    def open_interest(self) -> Dict[str, Tuple[Decimal, Decimal]]:
+        # Copies keep the read consistent when it happens outside the event loop thread applying the updates
+        long_quantities = self._long_quantities.copy()
+        short_quantities = self._short_quantities.copy()
+        prices = self._prices.copy()
+        open_interest = dict()
+        for market_id in long_quantities.keys() | short_quantities.keys():
+            price = prices.get(market_id)
+            if price is None:
+                continue
+            derivative_market = self._derivative_markets_map[market_id]
+            open_interest[derivative_market.trading_pair()] = (
+                long_quantities.get(market_id, Decimal(0)) * price,
+                short_quantities.get(market_id, Decimal(0)) * price,
+            )
+        return open_interest
+
+    async def start(self):
+        """Opens the stream and syncs in the background, `is_synced` tells when the open interest is ready."""
+        if self._stream_task is None or self._stream_task.done():
+            self._load_registry()
+            # The stream is opened first, so the updates sent while the snapshot is fetched are buffered
+            self._stream_delivering.clear()
+            self._stream_task = asyncio.create_task(self._listen_stream_loop())
+            self._schedule_resync()
+
+    async def stop(self):
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+            try:
+                await self._stream_task
+            except asyncio.CancelledError:
+                pass
+            self._stream_task = None
+        if self._resync_task is not None:
+            self._resync_task.cancel()
+            self._resync_task = None
+        self._synced.clear()
+        self._stream_delivering.clear()
+
+    async def _restart(self):
+        await self.stop()
+        await self.start()
+
+    def _schedule_resync(self):
+        if self._resync_task is None or self._resync_task.done():
+            self._resync_task = asyncio.create_task(self._resync_until_synced())
+
+    async def _resync_until_synced(self):
+        # The updates stay buffered while unsynced, so a failed resync is retried instead of waiting for a new gap
+        while True:
+            try:
+                await self.resync()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as exception:
+                print(f"Open interest resync failed: {exception}")
+            await asyncio.sleep(self._reconnect_delay)
+
+    def _schedule_restart(self):
+        if self._restart_task is None or self._restart_task.done():
+            self._restart_task = asyncio.create_task(self._restart())
+
+    def _load_registry(self):
+        # The stream filters are built from these markets, a new registry version restarts the stream
+        self._registry = self._market_registry.current
+        self._derivative_markets_map = self._registry.derivative_markets_map
+        self._oracle_keys = dict(self._registry.oracle_keys())
+        self._markets_for_oracle_symbol = {}
+        for market_id, (oracle_base, oracle_quote, oracle_type) in self._oracle_keys.items():
+            for symbol in (oracle_base, oracle_quote):
+                self._markets_for_oracle_symbol.setdefault((symbol, oracle_type.lower()), []).append(market_id)
+
+    async def resync(self):
+        self._synced.clear()
+        if self._stream_task is not None:
+            # A snapshot taken before the stream delivers could miss the blocks in between
+            await self._stream_delivering.wait()
+        # The updates buffered so far are not newer than the snapshot requested below, only later ones are replayed
+        snapshot_block_height = max(
+            [int(update.get('blockHeight', 0)) for update in self._pending_updates] + [self._last_block_height or 0])
+
+        positions = await self._query_executor.chain_positions()
+        self._positions = {}
+        self._long_quantities = {}
+        self._short_quantities = {}
+        for position in positions['state']:
+            self._apply_position(
+                market_id=position['marketId'],
+                subaccount_id=position['subaccountId'],
+                is_long=position['position']['isLong'],
+                chain_quantity=position['position']['quantity'],
+            )
+
+        # Markets without positions are priced too, their first position can come from the stream
+        oracle_prices = await fetch_oracle_prices(
+            query_executor=self._query_executor,
+            oracle_keys=self._oracle_keys.values(),
+        )
+        self._prices = {market_id: oracle_prices[key] for market_id, key in self._oracle_keys.items()}
+        self._oracle_symbol_prices = {}
+        self._last_block_height = None
+
+        pending_updates, self._pending_updates = self._pending_updates, []
+        for update in pending_updates:
+            if int(update.get('blockHeight', 0)) > snapshot_block_height:
+                self._apply_stream_update(update)
+        self._synced.set()
+
+    async def _listen_stream_loop(self):
+        while True:
+            oracle_symbols = sorted({symbol for key in self._oracle_keys.values() for symbol in key[:2]})
+            try:
+                await self._query_executor.listen_chain_stream_updates(
+                    callback=self._process_chain_stream_update,
+                    on_end_callback=self._synced.clear,
+                    on_status_callback=lambda exception: print(f"Chain stream error: {exception}"),
+                    positions_filter=chain_stream_query.PositionsFilter(
+                        subaccount_ids=["*"],
+                        market_ids=list(self._oracle_keys.keys()),
+                    ),
+                    oracle_price_filter=chain_stream_query.OraclePriceFilter(symbol=oracle_symbols),
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as exception:
+                print(f"Chain stream failed, resyncing open interest: {exception}")
+            self._synced.clear()
+            self._stream_delivering.clear()
+            await asyncio.sleep(self._reconnect_delay)
+            if self._resync_task is not None:
+                # A cancelled task is not done until it runs again, it is dropped so a new resync is scheduled
+                self._resync_task.cancel()
+                self._resync_task = None
+            # The open interest is resynced once the reopened stream delivers, the updates received meanwhile are
+            # buffered
+            self._schedule_resync()
+
+    def _process_chain_stream_update(self, update: Dict):
+        self._stream_delivering.set()
+        if not self._synced.is_set():
+            self._pending_updates.append(update)
+            return
+
+        block_height = int(update.get('blockHeight', 0))
+        if self._last_block_height is not None and block_height > self._last_block_height + 1:
+            print(f"Chain stream gap detected ({self._last_block_height} -> {block_height}), resyncing open interest")
+            self._synced.clear()
+            self._pending_updates.append(update)
+            self._schedule_resync()
+            return
+        if self._market_registry.current is not self._registry:
+            # The stream filters list the market ids, so the stream is reopened with the new markets
+            print("Markets changed, restarting the open interest stream")
+            self._synced.clear()
+            self._schedule_restart()
+            return
+
+        self._apply_stream_update(update)
+
+    def _apply_stream_update(self, update: Dict):
+        for position in update.get('positions', []):
+            self._apply_position(
+                market_id=position['marketId'],
+                subaccount_id=position['subaccountId'],
+                is_long=position['isLong'],
+                chain_quantity=position['quantity'],
+            )
+        for oracle_price in update.get('oraclePrices', []):
+            self._apply_oracle_price(
+                symbol=oracle_price['symbol'],
+                oracle_type=oracle_price['type'],
+                chain_price=oracle_price['price'],
+            )
+        block_height = int(update.get('blockHeight', 0))
+        if self._last_block_height is None or block_height > self._last_block_height:
+            self._last_block_height = block_height
+
+    def _apply_position(self, market_id: str, subaccount_id: str, is_long: bool, chain_quantity: str):
+        derivative_market = self._derivative_markets_map.get(market_id)
+        if derivative_market is None or market_id not in self._oracle_keys:
+            return
+
+        previous = self._positions.pop((market_id, subaccount_id), None)
+        if previous is not None:
+            previous_is_long, previous_quantity = previous
+            quantities = self._long_quantities if previous_is_long else self._short_quantities
+            quantities[market_id] -= previous_quantity
+
+        quantity = derivative_market.quantity_from_special_chain_format(Decimal(chain_quantity))
+        if quantity != 0:
+            self._positions[(market_id, subaccount_id)] = (is_long, quantity)
+            quantities = self._long_quantities if is_long else self._short_quantities
+            quantities[market_id] = quantities.get(market_id, Decimal(0)) + quantity
+
+    def _apply_oracle_price(self, symbol: str, oracle_type: str, chain_price: str):
+        oracle_type = oracle_type.lower()
+        self._oracle_symbol_prices[(symbol, oracle_type)] = Decimal(chain_price) / Decimal("1e18")
+        for market_id in self._markets_for_oracle_symbol.get((symbol, oracle_type), []):
+            oracle_base, oracle_quote, _ = self._oracle_keys[market_id]
+            base_key, quote_key = (oracle_base, oracle_type), (oracle_quote, oracle_type)
+            # A symbol that has not streamed since the snapshot (or never streams, e.g. USD) is seeded from the
+            # snapshot price of the market, instead of pricing the market against a missing counterpart
+            market_price = self._prices.get(market_id)
+            if market_price:
+                if base_key not in self._oracle_symbol_prices:
+                    self._oracle_symbol_prices[base_key] = market_price * self._oracle_symbol_prices[quote_key]
+                elif quote_key not in self._oracle_symbol_prices:
+                    self._oracle_symbol_prices[quote_key] = self._oracle_symbol_prices[base_key] / market_price
+            base_price = self._oracle_symbol_prices.get(base_key)
+            quote_price = self._oracle_symbol_prices.get(quote_key)
+            if base_price is None or not quote_price:
+                continue
+            self._prices[market_id] = base_price / quote_price
@@ -0,0 +1,434 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pyinjective.proto.injective.stream.v1beta1 import query_pb2 as chain_stream_query
+
+from constants import (
+    ORDERBOOK_MAX_PENDING_UPDATES,
+    ORDERBOOK_SNAPSHOT_MAX_CONCURRENCY,
+    ORDERBOOK_STREAM_RECONNECT_DELAY_SECONDS,
+)
+from injective_query_executor import BaseInjectiveQueryExecutor
+from market_registry import InjectiveMarket, MarketRegistryHolder
+
+BookSide = Tuple[np.ndarray, np.ndarray]
+
+EMPTY_SIDE: BookSide = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+
+
+@dataclass(frozen=True)
+class OrderbookDepth:
+    bid_prices: np.ndarray
+    bid_quantities: np.ndarray
+    ask_prices: np.ndarray
+    ask_quantities: np.ndarray
+
+
+def _sorted_levels(ticks: np.ndarray, quantities: np.ndarray) -> BookSide:
+    order = np.argsort(ticks, kind="stable")
+    ticks, quantities = ticks[order], quantities[order]
+    present = quantities > 0
+    return ticks[present], quantities[present]
+
+
+def _merge_levels(side: BookSide, update_ticks: np.ndarray, update_quantities: np.ndarray) -> BookSide:
+    # Updated levels replace the levels at the same price, a zero quantity removes the level. Updates touch a few
+    # levels, so the existing ones are found with a binary search and new ones are appended and sorted in
+    ticks, quantities = side
+    if len(update_ticks) > 1:
+        order = update_ticks.argsort(kind="stable")
+        update_ticks, update_quantities = update_ticks[order], update_quantities[order]
+        last_updates = update_ticks[1:] != update_ticks[:-1]
+        if not last_updates.all():
+            # The last update of a price level wins
+            last_updates = np.append(last_updates, True)
+            update_ticks, update_quantities = update_ticks[last_updates], update_quantities[last_updates]
+
+    positions = ticks.searchsorted(update_ticks)
+    existing = positions < len(ticks)
+    existing[existing] = ticks[positions[existing]] == update_ticks[existing]
+    quantities = quantities.copy()
+    quantities[positions[existing]] = update_quantities[existing]
+
+    inserted = ~existing
+    if inserted.any():
+        ticks = np.concatenate((ticks, update_ticks[inserted]))
+        quantities = np.concatenate((quantities, update_quantities[inserted]))
+        order = ticks.argsort(kind="stable")
+        ticks, quantities = ticks[order], quantities[order]
+    if not update_quantities.all():
+        present = quantities > 0
+        ticks, quantities = ticks[present], quantities[present]
+    return ticks, quantities
+
+
+class LocalOrderbook:
+    """Price levels of one market, as sorted NumPy arrays.
+
+    Prices are stored as int64 multiples of the market's tick size, so the levels of the snapshot and of the stream
+    updates match exactly, and quantities as float64. Both sides are sorted by ascending price: the best bid is the
+    last bid level and the best ask the first ask level. Each side is replaced as a whole on every update, so reads
+    from other threads always see a consistent side.
+    """
+
+    def __init__(self, market: InjectiveMarket):
+        self.market = market
+        self.tick_size = float(market.min_price_tick_size())
+        # Scalers from the special chain format to ticks and quantities, so converting a level is one multiplication
+        self._special_chain_price_ticks = float(market.prices_from_special_chain_format([1])[0]) / self.tick_size
+        self._special_chain_quantity_scaler = float(market.quantities_from_special_chain_format([1])[0])
+        self.sequence: Optional[int] = None
+        self.updated_at: Optional[float] = None
+        self._bids: BookSide = EMPTY_SIDE
+        self._asks: BookSide = EMPTY_SIDE
+
+    def reset(self, sequence: Optional[int], bids: BookSide, asks: BookSide):
+        self._bids = _sorted_levels(*bids)
+        self._asks = _sorted_levels(*asks)
+        self.sequence = sequence
+        self.updated_at = time.time()
+
+    def apply(self, sequence: int, bids: BookSide, asks: BookSide):
+        if len(bids[0]):
+            self._bids = _merge_levels(self._bids, *bids)
+        if len(asks[0]):
+            self._asks = _merge_levels(self._asks, *asks)
+        self.sequence = sequence
+        self.updated_at = time.time()
+
+    def update_side(self, levels: List[Dict]) -> BookSide:
+        # Stream and chain node snapshot levels are {"p": price, "q": quantity} in special chain format
+        if not levels:
+            return EMPTY_SIDE
+        prices = np.array([level['p'] for level in levels], dtype=np.float64)
+        quantities = np.array([level['q'] for level in levels], dtype=np.float64)
+        return (np.rint(prices * self._special_chain_price_ticks).astype(np.int64),
+                quantities * self._special_chain_quantity_scaler)
+
+    def best_bid(self) -> Optional[Tuple[float, float]]:
+        ticks, quantities = self._bids
+        if not len(ticks):
+            return None
+        return float(ticks[-1] * self.tick_size), float(quantities[-1])
+
+    def best_ask(self) -> Optional[Tuple[float, float]]:
+        ticks, quantities = self._asks
+        if not len(ticks):
+            return None
+        return float(ticks[0] * self.tick_size), float(quantities[0])
+
+    def mid_price(self) -> Optional[float]:
+        best_bid, best_ask = self.best_bid(), self.best_ask()
+        if best_bid is None or best_ask is None:
+            return None
+        return (best_bid[0] + best_ask[0]) / 2
+
+    def depth(self, levels: int) -> OrderbookDepth:
+        # Best levels first on both sides
+        bid_ticks, bid_quantities = self._bids
+        ask_ticks, ask_quantities = self._asks
+        return OrderbookDepth(
+            bid_prices=bid_ticks[::-1][:levels] * self.tick_size,
+            bid_quantities=bid_quantities[::-1][:levels],
+            ask_prices=ask_ticks[:levels] * self.tick_size,
+            ask_quantities=ask_quantities[:levels],
+        )
+
+    def notional_within(self, price_range: float) -> Optional[Tuple[float, float]]:
+        """Quote notional of the bids and asks priced within `price_range` (a ratio) of the mid price."""
+        bid_ticks, bid_quantities = self._bids
+        ask_ticks, ask_quantities = self._asks
+        mid_price = self.mid_price()
+        if mid_price is None:
+            return None
+        lowest_bid = np.searchsorted(bid_ticks, mid_price * (1 - price_range) / self.tick_size, side="left")
+        highest_ask = np.searchsorted(ask_ticks, mid_price * (1 + price_range) / self.tick_size, side="right")
+        bid_notional = np.dot(bid_ticks[lowest_bid:], bid_quantities[lowest_bid:]) * self.tick_size
+        ask_notional = np.dot(ask_ticks[:highest_ask], ask_quantities[:highest_ask]) * self.tick_size
+        return float(bid_notional), float(ask_notional)
+
+
+class OrderbookTracker:
+    """Keeps local orderbooks of many markets up to date from the chain stream.
+
+    Every book is bootstrapped from one chain node orderbook snapshot and then follows the `spotOrderbookUpdates`
+    and `derivativeOrderbookUpdates` received through `listen_chain_stream_updates`. Each market's updates carry a
+    sequence number that must grow by one: stale updates are dropped, and a gap resyncs only that market from a new
+    snapshot. The stream ending, or a new version of the market registry, resyncs every book.
+
+    The chain node snapshot has no sequence number (and the indexer orderbook sequence is a different counter), so
+    the snapshot is aligned with the stream instead: it is only requested once the stream is delivering, and every
+    update received while the market is resyncing is buffered and applied on top of it. Stream levels carry the
+    absolute quantity of a price level, so the buffered updates already included in the snapshot are reapplied
+    without changing the book. The book takes the sequence of the last buffered update, or of the next update when
+    none was buffered. A buffer that overflows `max_pending_updates` is dropped and a new snapshot is requested.
+    """
+
+    def __init__(
+            self,
+            query_executor: BaseInjectiveQueryExecutor,
+            market_registry: MarketRegistryHolder,
+            market_ids: Optional[Iterable[str]] = None,
+            snapshot_concurrency: int = ORDERBOOK_SNAPSHOT_MAX_CONCURRENCY,
+            reconnect_delay: float = ORDERBOOK_STREAM_RECONNECT_DELAY_SECONDS,
+            max_pending_updates: int = ORDERBOOK_MAX_PENDING_UPDATES,
+    ):
+        self._query_executor = query_executor
+        self._market_registry = market_registry
+        self._registry = market_registry.current
+        self._requested_market_ids = None if market_ids is None else tuple(market_ids)
+        self._snapshot_semaphore = asyncio.Semaphore(snapshot_concurrency)
+        self._reconnect_delay = reconnect_delay
+        self._max_pending_updates = max_pending_updates
+
+        self._books: Dict[str, LocalOrderbook] = {}
+        self._pending_updates: Dict[str, Deque[Dict]] = {}
+        self._resync_tasks: Dict[str, asyncio.Task] = {}
+        self._stream_task: Optional[asyncio.Task] = None
+        self._full_resync_task: Optional[asyncio.Task] = None
+        self._restart_task: Optional[asyncio.Task] = None
+        self._stream_delivering = asyncio.Event()
+        self._synced = False
+
+    @property
+    def is_synced(self) -> bool:
+        return self._synced
+
+    def market_ids(self) -> List[str]:
+        return list(self._books)
+
+    def book(self, market_id: str) -> Optional[LocalOrderbook]:
+        book = self._books.get(market_id)
+        if book is None or market_id in self._pending_updates:
+            return None
+        return book
+
+    def best_bid_ask(self, market_id: str) -> Tuple[Optional[Tuple[float, float]], Optional[Tuple[float, float]]]:
+        book = self.book(market_id)
+        if book is None:
+            return None, None
+        return book.best_bid(), book.best_ask()
+
+    def depth(self, market_id: str, levels: int) -> Optional[OrderbookDepth]:
+        book = self.book(market_id)
+        return book.depth(levels) if book is not None else None
+
+    async def start(self):
+        """Opens the stream and syncs the books in the background, `is_synced` tells when they are ready."""
+        if self._stream_task is None or self._stream_task.done():
+            self._create_books()
+            # The stream is opened first, so the updates sent while the snapshots are fetched are buffered
+            self._stream_delivering.clear()
+            self._stream_task = asyncio.create_task(self._listen_stream_loop())
+            self._schedule_full_resync()
+
+    async def load_snapshots(self):
+        """Fetches one snapshot of every book, without following the stream."""
+        self._create_books()
+        await self.resync(retry_failed=False)
+
+    async def stop(self):
+        if self._stream_task is not None:
+            self._stream_task.cancel()
+            try:
+                await self._stream_task
+            except asyncio.CancelledError:
+                pass
+            self._stream_task = None
+        if self._full_resync_task is not None:
+            self._full_resync_task.cancel()
+            self._full_resync_task = None
+        for task in self._resync_tasks.values():
+            task.cancel()
+        self._resync_tasks = {}
+        self._synced = False
+
+    async def resync(self, retry_failed: bool = True):
+        self._synced = False
+        for market_id in self._books:
+            self._pending_updates.setdefault(market_id, self._new_pending_updates())
+        if self._stream_task is not None:
+            # A snapshot taken before the stream delivers could miss the blocks in between
+            await self._stream_delivering.wait()
+        market_ids = list(self._books)
+        synced = await asyncio.gather(*[self._snapshot_market(market_id) for market_id in market_ids])
+        if retry_failed:
+            # A book that could not be snapshotted does not hold back the others, it keeps retrying in the background
+            for market_id, market_synced in zip(market_ids, synced):
+                if not market_synced:
+                    self._schedule_resync(market_id)
+        self._synced = True
+
+    def _create_books(self):
+        self._registry = self._market_registry.current
+        market_ids = self._requested_market_ids
+        if market_ids is None:
+            market_ids = list(self._registry.spot_markets_map) + list(self._registry.derivative_markets_map)
+        self._books = {}
+        for market_id in market_ids:
+            market = self._registry.market(market_id)
+            if market is None:
+                print(f"Market not found for market_id: {market_id}")
+                continue
+            self._books[market_id] = LocalOrderbook(market)
+        self._pending_updates = {market_id: self._new_pending_updates() for market_id in self._books}
+
+    def _new_pending_updates(self) -> Deque[Dict]:
+        return deque(maxlen=self._max_pending_updates)
+
+    def _is_spot(self, market_id: str) -> bool:
+        return market_id in self._registry.spot_markets_map
+
+    async def _restart(self):
+        await self.stop()
+        await self.start()
+
+    def _schedule_restart(self):
+        if self._restart_task is None or self._restart_task.done():
+            self._restart_task = asyncio.create_task(self._restart())
+
+    async def _listen_stream_loop(self):
+        while True:
+            spot_market_ids = [market_id for market_id in self._books if self._is_spot(market_id)]
+            derivative_market_ids = [market_id for market_id in self._books if not self._is_spot(market_id)]
+            try:
+                await self._query_executor.listen_chain_stream_updates(
+                    callback=self._process_chain_stream_update,
+                    on_end_callback=lambda: print("Orderbook stream ended"),
+                    on_status_callback=lambda exception: print(f"Orderbook stream error: {exception}"),
+                    spot_orderbooks_filter=chain_stream_query.OrderbookFilter(market_ids=spot_market_ids),
+                    derivative_orderbooks_filter=chain_stream_query.OrderbookFilter(market_ids=derivative_market_ids),
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as exception:
+                print(f"Orderbook stream failed, resyncing the orderbooks: {exception}")
+            self._synced = False
+            self._stream_delivering.clear()
+            for task in self._resync_tasks.values():
+                task.cancel()
+            self._resync_tasks = {}
+            for market_id in self._books:
+                self._pending_updates.setdefault(market_id, self._new_pending_updates())
+            await asyncio.sleep(self._reconnect_delay)
+            if self._full_resync_task is not None:
+                # A cancelled task is not done until it runs again, it is dropped so a new resync is scheduled
+                self._full_resync_task.cancel()
+                self._full_resync_task = None
+            # The books are resynced once the reopened stream delivers, the updates received meanwhile are buffered
+            self._schedule_full_resync()
+
+    def _schedule_full_resync(self):
+        if self._full_resync_task is None or self._full_resync_task.done():
+            self._full_resync_task = asyncio.create_task(self._resync_in_background())
+
+    async def _resync_in_background(self):
+        try:
+            await self.resync()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exception:
+            print(f"Orderbook resync failed: {exception}")
+
+    def _process_chain_stream_update(self, update: Dict):
+        self._stream_delivering.set()
+        if self._market_registry.current is not self._registry and self._requested_market_ids is None:
+            # The stream filters list the market ids, so the stream is reopened with the new markets
+            print("Markets changed, restarting the orderbook stream")
+            self._registry = self._market_registry.current
+            self._schedule_restart()
+            return
+
+        for orderbook_update in update.get('spotOrderbookUpdates', []):
+            self._process_orderbook_update(orderbook_update)
+        for orderbook_update in update.get('derivativeOrderbookUpdates', []):
+            self._process_orderbook_update(orderbook_update)
+
+    def _process_orderbook_update(self, orderbook_update: Dict):
+        market_id = orderbook_update['orderbook']['marketId']
+        book = self._books.get(market_id)
+        if book is None:
+            return
+        pending_updates = self._pending_updates.get(market_id)
+        if pending_updates is not None:
+            pending_updates.append(orderbook_update)
+            return
+
+        sequence = int(orderbook_update['seq'])
+        if book.sequence is None:
+            # First update after a snapshot that nothing was buffered on top of
+            self._apply_orderbook_update(book, orderbook_update)
+            return
+        if sequence <= book.sequence:
+            return
+        if sequence > book.sequence + 1:
+            print(f"Orderbook gap detected for {market_id} ({book.sequence} -> {sequence}), resyncing the book")
+            pending_updates = self._new_pending_updates()
+            pending_updates.append(orderbook_update)
+            self._pending_updates[market_id] = pending_updates
+            self._schedule_resync(market_id)
+            return
+        self._apply_orderbook_update(book, orderbook_update)
+
+    def _schedule_resync(self, market_id: str):
+        task = self._resync_tasks.get(market_id)
+        if task is None or task.done():
+            self._resync_tasks[market_id] = asyncio.create_task(self._resync_market(market_id))
+
+    async def _resync_market(self, market_id: str):
+        while not await self._snapshot_market(market_id):
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _snapshot_market(self, market_id: str) -> bool:
+        book = self._books[market_id]
+        try:
+            async with self._snapshot_semaphore:
+                if self._is_spot(market_id):
+                    snapshot = await self._query_executor.get_chain_spot_orderbook(market_id=market_id)
+                else:
+                    snapshot = await self._query_executor.get_chain_derivative_orderbook(market_id=market_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exception:
+            print(f"Orderbook snapshot failed for {market_id}: {exception}")
+            return False
+
+        pending_updates = self._pending_updates.get(market_id)
+        if pending_updates is None:
+            # Another snapshot synced the book meanwhile
+            return True
+        if len(pending_updates) == pending_updates.maxlen:
+            # Updates that are not in the snapshot may have been dropped, the next snapshot starts a new buffer
+            print(f"Orderbook updates buffer full for {market_id}, requesting a new snapshot")
+            self._pending_updates[market_id] = self._new_pending_updates()
+            return False
+
+        pending_updates = sorted(pending_updates, key=lambda update: int(update['seq']))
+        book.reset(
+            sequence=None,
+            bids=book.update_side(snapshot['buys']),
+            asks=book.update_side(snapshot['sells']),
+        )
+        for orderbook_update in pending_updates:
+            sequence = int(orderbook_update['seq'])
+            if book.sequence is not None and sequence <= book.sequence:
+                continue
+            if book.sequence is not None and sequence > book.sequence + 1:
+                # The buffered updates are not contiguous, the next snapshot starts a new buffer
+                self._pending_updates[market_id] = self._new_pending_updates()
+                return False
+            self._apply_orderbook_update(book, orderbook_update)
+        del self._pending_updates[market_id]
+        return True
+
+    def _apply_orderbook_update(self, book: LocalOrderbook, orderbook_update: Dict):
+        orderbook = orderbook_update['orderbook']
+        book.apply(
+            sequence=int(orderbook_update['seq']),
+            bids=book.update_side(orderbook.get('buyLevels', [])),
+            asks=book.update_side(orderbook.get('sellLevels', [])),
+        )
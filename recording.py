@@ -0,0 +1,307 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import random
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from constants import MONGO_CURSOR_BATCH_SIZE, RECORDING_STREAM_FLUSH_EVENTS
+from injective_query_executor import (
+    STREAM_METHODS,
+    TRANSACTION_METHODS,
+    BaseInjectiveQueryExecutor,
+    WrappedInjectiveQueryExecutor,
+)
+
+
+def recording_path(directory: str, name: str, *args, **kwargs) -> str:
+    # Arguments are hashed through their JSON form, protobuf filters and datetimes through their str()
+    arguments = json.dumps([args, kwargs], sort_keys=True, default=str)
+    digest = hashlib.sha1(arguments.encode()).hexdigest()[:20]
+    return os.path.join(directory, f"{name}-{digest}.pickle.gz")
+
+
+def save_recording(path: str, value: Any):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with gzip.open(temporary_path, "wb") as recording_file:
+        pickle.dump(value, recording_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+
+
+def load_recording(path: str) -> Any:
+    with gzip.open(path, "rb") as recording_file:
+        return pickle.load(recording_file)
+
+
+class _RecordingPagesWriter:
+    """Appends pages to a recording one pickle at a time, the file is moved in place once complete."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._path = path
+        self._temporary_path = f"{path}.tmp"
+        self._file = gzip.open(self._temporary_path, "wb")
+
+    def write(self, page: List):
+        pickle.dump(page, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        self._file.close()
+        os.replace(self._temporary_path, self._path)
+
+    def discard(self):
+        self._file.close()
+        os.remove(self._temporary_path)
+
+
+def load_recording_pages(path: str) -> Iterator[List]:
+    # A recording saved in one piece (e.g. with save_recording) is a single page
+    with gzip.open(path, "rb") as recording_file:
+        while True:
+            try:
+                yield pickle.load(recording_file)
+            except EOFError:
+                return
+
+
+class RecordedStreamError(Exception):
+    """Error reported through a stream's `on_status_callback` while it was recorded, replayed the same way."""
+
+
+async def _invoke(callback: Optional[Callable], *args):
+    if callback is None:
+        return
+    if asyncio.iscoroutinefunction(callback):
+        await callback(*args)
+    else:
+        callback(*args)
+
+
+class RecordingInjectiveQueryExecutor(WrappedInjectiveQueryExecutor):
+    """Saves the responses of the wrapped executor to gzip-compressed pickle files in `directory`.
+
+    There is one file per method and arguments, holding the last response received. Stream events are saved as a
+    list every `stream_flush_events` events and when the stream ends, together with the errors reported to
+    `on_status_callback` (as `RecordedStreamError`). Transactions are forwarded without being recorded.
+    """
+
+    def __init__(self,
+                 executor: BaseInjectiveQueryExecutor,
+                 directory: str,
+                 stream_flush_events: int = RECORDING_STREAM_FLUSH_EVENTS):
+        super().__init__(executor=executor)
+        self._directory = directory
+        self._stream_flush_events = stream_flush_events
+
+    async def _call(self, method_name: str, *args, **kwargs):
+        if method_name in TRANSACTION_METHODS:
+            return await super()._call(method_name, *args, **kwargs)
+        if method_name in STREAM_METHODS:
+            return await self._record_stream(method_name, **kwargs)
+
+        response = await super()._call(method_name, *args, **kwargs)
+        save_recording(recording_path(self._directory, method_name, *args, **kwargs), response)
+        return response
+
+    async def _record_stream(self, method_name: str, callback: Callable,
+                             on_status_callback: Optional[Callable] = None, **kwargs):
+        path = recording_path(self._directory, method_name, **_stream_filters(kwargs))
+        events: List[Any] = []
+
+        def append(event: Any):
+            events.append(event)
+            if len(events) % self._stream_flush_events == 0:
+                save_recording(path, events)
+
+        async def record_event(event: Dict):
+            append(event)
+            await _invoke(callback, event)
+
+        async def record_status(exception: Exception):
+            # The exception itself may not be picklable (e.g. gRPC errors), its message is kept
+            append(RecordedStreamError(str(exception)))
+            await _invoke(on_status_callback, exception)
+
+        try:
+            return await super()._call(method_name, callback=record_event, on_status_callback=record_status,
+                                       **kwargs)
+        finally:
+            save_recording(path, events)
+
+
+class ReplayInjectiveQueryExecutor(WrappedInjectiveQueryExecutor):
+    """Serves the responses saved by `RecordingInjectiveQueryExecutor` without any network access.
+
+    Every call waits `latency` seconds (plus up to `latency_jitter` seconds) to simulate the round trip. Recorded
+    streams deliver their events and errors `stream_event_interval` seconds apart and then end.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 latency: float = 0.0,
+                 latency_jitter: float = 0.0,
+                 stream_event_interval: float = 0.0):
+        super().__init__(executor=None)
+        self._directory = directory
+        self._latency = latency
+        self._latency_jitter = latency_jitter
+        self._stream_event_interval = stream_event_interval
+        self._recordings: Dict[str, Any] = {}
+
+    async def _call(self, method_name: str, *args, **kwargs):
+        if method_name in STREAM_METHODS:
+            return await self._replay_stream(method_name, **kwargs)
+
+        await self._simulate_latency()
+        return self._recording(recording_path(self._directory, method_name, *args, **kwargs), method_name)
+
+    async def _replay_stream(self, method_name: str, callback: Callable, on_end_callback: Optional[Callable] = None,
+                             on_status_callback: Optional[Callable] = None, **kwargs):
+        events = self._recording(recording_path(self._directory, method_name, **_stream_filters(kwargs)), method_name)
+        await self._simulate_latency()
+        for event in events:
+            if isinstance(event, RecordedStreamError):
+                await _invoke(on_status_callback, event)
+            else:
+                await _invoke(callback, event)
+            await asyncio.sleep(self._stream_event_interval)
+        await _invoke(on_end_callback)
+
+    def _recording(self, path: str, method_name: str) -> Any:
+        recording = self._recordings.get(path)
+        if recording is None:
+            if not os.path.exists(path):
+                raise KeyError(f"No recorded response for {method_name} with these arguments ({path})")
+            recording = load_recording(path)
+            self._recordings[path] = recording
+        return recording
+
+    async def _simulate_latency(self):
+        delay = self._latency + random.uniform(0, self._latency_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _stream_filters(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: value for name, value in kwargs.items()
+            if name not in ("callback", "on_end_callback", "on_status_callback")}
+
+
+class _RecordingCursor:
+    def __init__(self, cursor, path: str):
+        self._cursor = cursor
+        self._writer: Optional[_RecordingPagesWriter] = _RecordingPagesWriter(path)
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict]:
+        # Pages are written as they are received, so the recording never holds the whole result in memory
+        documents = await self._cursor.to_list(length)
+        if self._writer is not None:
+            if documents:
+                self._writer.write(documents)
+            # A page shorter than requested is the last one
+            if length is None or len(documents) < length:
+                self._writer.close()
+                self._writer = None
+        return documents
+
+    async def close(self):
+        if self._writer is not None:
+            # The rest of the result is recorded too, so the replay serves the whole aggregation
+            try:
+                while self._writer is not None:
+                    await self.to_list(MONGO_CURSOR_BATCH_SIZE)
+            except Exception as exception:
+                print(f"Aggregation recording discarded: {exception}")
+                self._writer.discard()
+                self._writer = None
+        await self._cursor.close()
+
+
+class _ReplayCursor:
+    def __init__(self, path: str, latency: float):
+        self._pages = load_recording_pages(path)
+        self._documents: List[Dict] = []
+        self._latency = latency
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict]:
+        if self._latency > 0:
+            await asyncio.sleep(self._latency)
+        # The recorded pages do not have to match the requested length
+        while length is None or len(self._documents) < length:
+            page = next(self._pages, None)
+            if page is None:
+                break
+            self._documents.extend(page)
+        end = len(self._documents) if length is None else length
+        documents, self._documents = self._documents[:end], self._documents[end:]
+        return documents
+
+    async def close(self):
+        self._pages.close()
+
+
+class _RecordingCollection:
+    def __init__(self, collection, directory: str, db_name: Optional[str], collection_name: Optional[str]):
+        self._collection = collection
+        self._directory = directory
+        self._db_name = db_name
+        self._collection_name = collection_name
+
+    def aggregate(self, pipeline: List[Dict], **kwargs) -> _RecordingCursor:
+        path = recording_path(self._directory, "aggregate", self._db_name, self._collection_name, pipeline)
+        return _RecordingCursor(cursor=self._collection.aggregate(pipeline, **kwargs), path=path)
+
+
+class _ReplayCollection:
+    def __init__(self, pool: "ReplayMongoConnectionPool", db_name: Optional[str], collection_name: Optional[str]):
+        self._pool = pool
+        self._db_name = db_name
+        self._collection_name = collection_name
+
+    def aggregate(self, pipeline: List[Dict], **kwargs) -> _ReplayCursor:
+        path = recording_path(self._pool.directory, "aggregate", self._db_name, self._collection_name, pipeline)
+        if not os.path.exists(path):
+            raise KeyError(f"No recorded result for the aggregation pipeline {pipeline} ({path})")
+        return _ReplayCursor(path=path, latency=self._pool.latency)
+
+
+class RecordingMongoConnectionPool:
+    """Wraps a `MongoConnectionPool` and saves the full result of every aggregation to `directory`, page by page."""
+
+    def __init__(self, pool, directory: str):
+        self._pool = pool
+        self._directory = directory
+
+    @property
+    def settings(self):
+        return self._pool.settings
+
+    async def get_collection(self, db_name: Optional[str] = None, collection: Optional[str] = None):
+        mongo_collection = await self._pool.get_collection(db_name=db_name, collection=collection)
+        return _RecordingCollection(collection=mongo_collection, directory=self._directory, db_name=db_name,
+                                    collection_name=collection)
+
+    def close(self):
+        self._pool.close()
+
+
+class ReplayMongoConnectionPool:
+    """Stand-in for `MongoConnectionPool` serving the aggregation results saved by `RecordingMongoConnectionPool`."""
+
+    def __init__(self, settings, directory: str, latency: float = 0.0):
+        self._settings = settings
+        self.directory = directory
+        self.latency = latency
+
+    @property
+    def settings(self):
+        return self._settings
+
+    async def get_collection(self, db_name: Optional[str] = None, collection: Optional[str] = None):
+        return _ReplayCollection(pool=self, db_name=db_name, collection_name=collection)
+
+    def close(self):
+        pass
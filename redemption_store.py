@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from constants import (
+    REDEMPTION_FULL_SYNC_INTERVAL_SECONDS,
+    REDEMPTION_STORE_PATH,
+    REDEMPTION_SYNC_MAX_CONCURRENCY,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from injective_query_executor import BaseInjectiveQueryExecutor
+
+PENDING_STATUS = "pending"
+DISBURSED_STATUS = "disbursed"
+
+
+class RedemptionStore:
+    """Local copy of the insurance fund redemption schedules keyed by `redemptionId`.
+
+    The redemptions endpoint has no pagination or time filter, so after the first full download only the pending
+    schedules are requested. Schedules that stop being pending are fetched again, filtered by redeemer and denom, to
+    get their disbursed state. A full download is repeated every `full_sync_interval` seconds as a safety net.
+    """
+
+    def __init__(self,
+                 path: str = REDEMPTION_STORE_PATH,
+                 full_sync_interval: float = REDEMPTION_FULL_SYNC_INTERVAL_SECONDS,
+                 max_concurrency: int = REDEMPTION_SYNC_MAX_CONCURRENCY):
+        self._path = path
+        self._full_sync_interval = full_sync_interval
+        self._max_concurrency = max_concurrency
+        self._redemptions: Dict[str, Dict[str, Any]] = {}
+        self._last_full_sync: float = 0
+        self._load()
+
+    def redemption_schedules(self) -> List[Dict[str, Any]]:
+        return list(self._redemptions.values())
+
+    async def sync(self, query_executor: "BaseInjectiveQueryExecutor"):
+        if not self._redemptions or time.time() - self._last_full_sync > self._full_sync_interval:
+            response = await query_executor.redemptions()
+            self._redemptions = {
+                redemption['redemptionId']: redemption for redemption in response.get('redemptionSchedules', [])
+            }
+            self._last_full_sync = time.time()
+        else:
+            response = await query_executor.redemptions(status=PENDING_STATUS)
+            pending = {
+                redemption['redemptionId']: redemption for redemption in response.get('redemptionSchedules', [])
+            }
+            settled = [
+                redemption for redemption_id, redemption in self._redemptions.items()
+                if redemption.get('status') == PENDING_STATUS and redemption_id not in pending
+            ]
+            self._redemptions.update(pending)
+            await self._refresh_settled(query_executor=query_executor, settled=settled)
+
+        self._save()
+
+    async def _refresh_settled(self, query_executor: "BaseInjectiveQueryExecutor", settled: List[Dict[str, Any]]):
+        redeemers_and_denoms = {(redemption['redeemer'], redemption['redemptionDenom']) for redemption in settled}
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def fetch_disbursed(redeemer: str, denom: str):
+            async with semaphore:
+                return await query_executor.redemptions(address=redeemer, denom=denom, status=DISBURSED_STATUS)
+
+        responses = await asyncio.gather(*[
+            fetch_disbursed(redeemer, denom) for redeemer, denom in redeemers_and_denoms
+        ])
+        for response in responses:
+            for redemption in response.get('redemptionSchedules', []):
+                self._redemptions[redemption['redemptionId']] = redemption
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return
+        with open(self._path) as store_file:
+            stored = json.load(store_file)
+        self._redemptions = {redemption['redemptionId']: redemption for redemption in stored['redemptionSchedules']}
+        self._last_full_sync = stored['lastFullSync']
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        temporary_path = f"{self._path}.tmp"
+        with open(temporary_path, "w") as store_file:
+            json.dump({
+                'lastFullSync': self._last_full_sync,
+                'redemptionSchedules': self.redemption_schedules(),
+            }, store_file)
+        os.replace(temporary_path, self._path)
+
+
+_redemption_store: Optional[RedemptionStore] = None
+
+
+def get_redemption_store() -> RedemptionStore:
+    global _redemption_store
+    if _redemption_store is None:
+        _redemption_store = RedemptionStore()
+    return _redemption_store
@@ -0,0 +1,251 @@
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, replace
+from typing import Deque, Dict, Mapping, Optional
+
+import grpc
+
+from constants import (
+    QUERY_EXECUTOR_HEDGE_QUANTILE,
+    QUERY_EXECUTOR_HEDGED_METHODS,
+    QUERY_EXECUTOR_INITIAL_CONCURRENCY,
+    QUERY_EXECUTOR_MAX_CONCURRENCY,
+    QUERY_EXECUTOR_MIN_CONCURRENCY,
+    QUERY_EXECUTOR_RETRY_ATTEMPTS,
+    QUERY_EXECUTOR_RETRY_BASE_DELAY_SECONDS,
+    QUERY_EXECUTOR_RETRY_MAX_DELAY_SECONDS,
+)
+from injective_query_executor import (
+    STREAM_METHODS,
+    TRANSACTION_METHODS,
+    BaseInjectiveQueryExecutor,
+    WrappedInjectiveQueryExecutor,
+)
+
+RETRYABLE_STATUS_CODES = frozenset({
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.ABORTED,
+})
+
+
+@dataclass(frozen=True)
+class MethodPolicy:
+    attempts: int = QUERY_EXECUTOR_RETRY_ATTEMPTS
+    retry_base_delay: float = QUERY_EXECUTOR_RETRY_BASE_DELAY_SECONDS
+    retry_max_delay: float = QUERY_EXECUTOR_RETRY_MAX_DELAY_SECONDS
+    hedge: bool = False
+    hedge_quantile: float = QUERY_EXECUTOR_HEDGE_QUANTILE
+    limited: bool = True
+
+
+DEFAULT_METHOD_POLICY = MethodPolicy()
+# Transactions are not idempotent and streams hold their slot for as long as they are open
+PASS_THROUGH_METHOD_POLICY = MethodPolicy(attempts=1, limited=False)
+
+
+def default_method_policies() -> Dict[str, MethodPolicy]:
+    policies = {method_name: PASS_THROUGH_METHOD_POLICY for method_name in STREAM_METHODS | TRANSACTION_METHODS}
+    policies.update({method_name: replace(DEFAULT_METHOD_POLICY, hedge=True)
+                     for method_name in QUERY_EXECUTOR_HEDGED_METHODS})
+    return policies
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, grpc.RpcError) and hasattr(error, "code"):
+        return error.code() in RETRYABLE_STATUS_CODES
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError))
+
+
+class AdaptiveConcurrencyLimiter:
+    """Concurrency limit that follows the latency and the errors of the endpoint.
+
+    Each method keeps a short window latency (exponentially smoothed) and a baseline, the lowest short window
+    latency, which only drifts up slowly. The limit follows the gradient between them: it grows while the short
+    window latency stays within `latency_tolerance` of the baseline, and shrinks in proportion when the latency
+    inflates over several calls. A single slow call barely moves the short window, so normal jitter does not throttle
+    the endpoint. Retryable errors still back the limit off multiplicatively. Latencies are kept per method, so a
+    slow method (e.g. a large Mongo-backed query) is not compared against a cheap one.
+    """
+
+    def __init__(self,
+                 initial_limit: int = QUERY_EXECUTOR_INITIAL_CONCURRENCY,
+                 min_limit: int = QUERY_EXECUTOR_MIN_CONCURRENCY,
+                 max_limit: int = QUERY_EXECUTOR_MAX_CONCURRENCY,
+                 latency_tolerance: float = 1.5,
+                 backoff_ratio: float = 0.9,
+                 baseline_drift: float = 0.001,
+                 latency_smoothing: float = 0.1,
+                 limit_smoothing: float = 0.2,
+                 queue_size: float = 2.0):
+        self._limit = float(initial_limit)
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._latency_tolerance = latency_tolerance
+        self._backoff_ratio = backoff_ratio
+        self._baseline_drift = baseline_drift
+        self._latency_smoothing = latency_smoothing
+        self._limit_smoothing = limit_smoothing
+        self._queue_size = queue_size
+        self._baseline_latencies: Dict[Optional[str], float] = {}
+        self._recent_latencies: Dict[Optional[str], float] = {}
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self):
+        while self._in_flight >= int(self._limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self._in_flight += 1
+
+    def baseline_latency(self, method_name: Optional[str] = None) -> Optional[float]:
+        return self._baseline_latencies.get(method_name)
+
+    def release(self, latency: Optional[float], overloaded: bool, method_name: Optional[str] = None):
+        self._update_limit(latency=latency, overloaded=overloaded, method_name=method_name)
+        self._in_flight -= 1
+        for _ in range(max(0, int(self._limit) - self._in_flight)):
+            if not self._waiters:
+                break
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _update_limit(self, latency: Optional[float], overloaded: bool, method_name: Optional[str]):
+        if overloaded:
+            self._limit = max(self._min_limit, self._limit * self._backoff_ratio)
+            return
+        if latency is None:
+            return
+
+        recent_latency = self._recent_latencies.get(method_name, latency)
+        recent_latency += (latency - recent_latency) * self._latency_smoothing
+        baseline_latency = self._baseline_latencies.get(method_name, recent_latency)
+        # The baseline drifts up by a bounded ratio per call, so it settles after the endpoint got permanently
+        # slower without following the latency inflation caused by the load
+        baseline_latency = min(recent_latency, baseline_latency * (1 + self._baseline_drift))
+        self._baseline_latencies[method_name] = baseline_latency
+        self._recent_latencies[method_name] = recent_latency
+
+        gradient = max(0.5, min(1.0, self._latency_tolerance * baseline_latency / recent_latency))
+        if gradient >= 1.0 and self._in_flight < self._limit / 2:
+            # The callers do not use the current limit, there is nothing to learn about a higher one
+            return
+        new_limit = self._limit * gradient + self._queue_size
+        new_limit = self._limit + (new_limit - self._limit) * self._limit_smoothing
+        self._limit = max(self._min_limit, min(self._max_limit, new_limit))
+
+
+class ResilientInjectiveQueryExecutor(WrappedInjectiveQueryExecutor):
+    """Protects the endpoint behind the wrapped executor and cuts the tail latency of the queries.
+
+    Calls go through an adaptive concurrency limit, idempotent queries are retried with jittered exponential
+    backoff on transient errors, and hedged methods send a second request when the first one is slower than the
+    observed latency quantile. The behavior of each method is configured with a `MethodPolicy`.
+    """
+
+    LATENCY_SAMPLES = 200
+    MIN_HEDGE_SAMPLES = 20
+
+    def __init__(self,
+                 executor: BaseInjectiveQueryExecutor,
+                 limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+                 method_policies: Optional[Mapping[str, MethodPolicy]] = None,
+                 default_policy: MethodPolicy = DEFAULT_METHOD_POLICY):
+        super().__init__(executor=executor)
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+        self._method_policies = dict(default_method_policies() if method_policies is None else method_policies)
+        self._default_policy = default_policy
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def policy(self, method_name: str) -> MethodPolicy:
+        return self._method_policies.get(method_name, self._default_policy)
+
+    async def _call(self, method_name: str, *args, **kwargs):
+        policy = self.policy(method_name)
+        if not policy.limited and policy.attempts <= 1:
+            return await super()._call(method_name, *args, **kwargs)
+
+        attempt = 1
+        while True:
+            try:
+                if policy.hedge:
+                    return await self._hedged_call(method_name, policy, *args, **kwargs)
+                return await self._limited_call(method_name, policy, *args, **kwargs)
+            except Exception as error:
+                if attempt >= policy.attempts or not is_retryable(error):
+                    raise
+                delay = min(policy.retry_max_delay, policy.retry_base_delay * 2 ** (attempt - 1))
+                # Full jitter, so the retries of a burst of failed calls are spread out
+                await asyncio.sleep(random.uniform(0, delay))
+                attempt += 1
+
+    async def _limited_call(self, method_name: str, policy: MethodPolicy, *args, **kwargs):
+        if not policy.limited:
+            return await super()._call(method_name, *args, **kwargs)
+
+        await self.limiter.acquire()
+        started_at = time.perf_counter()
+        latency = None
+        overloaded = False
+        try:
+            response = await super()._call(method_name, *args, **kwargs)
+            latency = time.perf_counter() - started_at
+            self._record_latency(method_name, latency)
+            return response
+        except Exception as error:
+            overloaded = is_retryable(error)
+            raise
+        finally:
+            self.limiter.release(latency=latency, overloaded=overloaded, method_name=method_name)
+
+    async def _hedged_call(self, method_name: str, policy: MethodPolicy, *args, **kwargs):
+        hedge_delay = self._latency_quantile(method_name, policy.hedge_quantile)
+        primary = asyncio.ensure_future(self._limited_call(method_name, policy, *args, **kwargs))
+        pending = {primary}
+        try:
+            if hedge_delay is not None:
+                done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    pending.add(asyncio.ensure_future(self._limited_call(method_name, policy, *args, **kwargs)))
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # Every request failed, the error of the primary one is reported
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _record_latency(self, method_name: str, latency: float):
+        latencies = self._latencies.get(method_name)
+        if latencies is None:
+            latencies = deque(maxlen=self.LATENCY_SAMPLES)
+            self._latencies[method_name] = latencies
+        latencies.append(latency)
+
+    def _latency_quantile(self, method_name: str, quantile: float) -> Optional[float]:
+        latencies = self._latencies.get(method_name)
+        if latencies is None or len(latencies) < self.MIN_HEDGE_SAMPLES:
+            return None
+        ordered_latencies = sorted(latencies)
+        return ordered_latencies[min(len(ordered_latencies) - 1, int(quantile * len(ordered_latencies)))]
@@ -0,0 +1,188 @@
+import ast
+import importlib
+import os
+import pkgutil
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+import streamlit as st
+
+from async_runtime import AsyncRuntime
+from constants import (
+    OPEN_INTEREST_STREAMING_ENABLED,
+    ORDERBOOK_STREAMING_ENABLED,
+    QUERY_EXECUTOR_CACHE_ENABLED,
+    QUERY_EXECUTOR_INSTRUMENTATION_ENABLED,
+    QUERY_EXECUTOR_RESILIENCE_ENABLED,
+)
+from snapshot_store import SnapshotStore
+from streamlit_pages.streamlite_page import PageResultCache, StreamlitPage
+
+if TYPE_CHECKING:  # pragma: no cover
+    from pyinjective.async_client import AsyncClient
+
+    from injective_query_executor import BaseInjectiveQueryExecutor
+    from instrumented_query_executor import QueryExecutorMetrics
+    from market_registry import MarketRegistryHolder
+    from open_interest import OpenInterestTracker
+    from orderbooks import OrderbookTracker
+
+PAGES_PACKAGE = 'streamlit_pages'
+
+
+@dataclass(frozen=True)
+class PageSpec:
+    title: str
+    module_name: str
+    class_name: str
+    days_lookback_enabled: bool = False
+
+
+def _page_spec_from_class(module_name: str, class_node: ast.ClassDef) -> Optional[PageSpec]:
+    if not any(isinstance(base, ast.Name) and base.id == StreamlitPage.__name__ for base in class_node.bases):
+        return None
+
+    title = None
+    days_lookback_enabled = False
+    for node in class_node.body:
+        if isinstance(node, ast.FunctionDef) and node.name == 'title':
+            for statement in node.body:
+                if isinstance(statement, ast.Return) and isinstance(statement.value, ast.Constant):
+                    title = statement.value.value
+        elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant):
+            if any(isinstance(target, ast.Name) and target.id == 'days_lookback_enabled' for target in node.targets):
+                days_lookback_enabled = bool(node.value.value)
+
+    if title is None:
+        return None
+    return PageSpec(
+        title=title,
+        module_name=module_name,
+        class_name=class_node.name,
+        days_lookback_enabled=days_lookback_enabled,
+    )
+
+
+def import_page_class(page_spec: PageSpec) -> type:
+    return getattr(importlib.import_module(page_spec.module_name), page_spec.class_name)
+
+
+def discover_pages() -> Dict[str, PageSpec]:
+    # Pages are found by parsing the modules in the streamlit_pages directory, so no page module (and none of its
+    # dependencies) is imported until the page is selected. The title must be returned as a literal by title()
+    pages_dict = {}
+
+    for (_, name, _) in pkgutil.iter_modules([PAGES_PACKAGE]):
+        with open(os.path.join(PAGES_PACKAGE, f'{name}.py')) as module_file:
+            module_tree = ast.parse(module_file.read())
+
+        for node in module_tree.body:
+            if isinstance(node, ast.ClassDef):
+                page_spec = _page_spec_from_class(module_name=f'{PAGES_PACKAGE}.{name}', class_node=node)
+                if page_spec is not None:
+                    pages_dict[page_spec.title] = page_spec
+
+    return pages_dict
+
+
+@dataclass
+class MarketMonitorRuntime:
+    async_runtime: AsyncRuntime
+    client: "AsyncClient"
+    query_executor: "BaseInjectiveQueryExecutor"
+    market_registry: "MarketRegistryHolder"
+    result_cache: PageResultCache
+    open_interest_tracker: Optional["OpenInterestTracker"] = None
+    orderbook_tracker: Optional["OrderbookTracker"] = None
+    snapshot_store: Optional[SnapshotStore] = None
+    query_executor_metrics: Optional["QueryExecutorMetrics"] = None
+    page_specs: Dict[str, PageSpec] = field(default_factory=dict)
+    pages: Dict[str, StreamlitPage] = field(default_factory=dict)
+    pages_lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def page_kwargs(self) -> Dict[str, Any]:
+        return dict(
+            async_runtime=self.async_runtime,
+            query_executor=self.query_executor,
+            market_registry=self.market_registry,
+            result_cache=self.result_cache,
+            open_interest_tracker=self.open_interest_tracker,
+            orderbook_tracker=self.orderbook_tracker,
+            snapshot_store=self.snapshot_store,
+        )
+
+    def get_page(self, title: str) -> StreamlitPage:
+        with self.pages_lock:
+            page = self.pages.get(title)
+            if page is None:
+                page_spec = self.page_specs[title]
+                page = import_page_class(page_spec)(**self.page_kwargs())
+                self.pages[title] = page
+            return page
+
+
+async def create_client() -> "AsyncClient":
+    from pyinjective.async_client import AsyncClient
+    from pyinjective.core.network import Network
+
+    # The gRPC channels bind to the event loop they are created on
+    network = Network.mainnet()
+    return AsyncClient(
+        network=network,
+    )
+
+
+@st.cache_resource
+def get_runtime() -> MarketMonitorRuntime:
+    from caching_query_executor import CachingInjectiveQueryExecutor
+    from injective_query_executor import PythonSDKInjectiveQueryExecutor
+    from instrumented_query_executor import InstrumentedInjectiveQueryExecutor
+    from market_registry import load_market_registry
+    from open_interest import OpenInterestTracker
+    from orderbooks import OrderbookTracker
+    from resilient_query_executor import ResilientInjectiveQueryExecutor
+
+    async_runtime = AsyncRuntime()
+    client = async_runtime.run(create_client())
+    query_executor = PythonSDKInjectiveQueryExecutor(sdk_client=client)
+    if QUERY_EXECUTOR_RESILIENCE_ENABLED:
+        query_executor = ResilientInjectiveQueryExecutor(executor=query_executor)
+    query_executor_metrics = None
+    if QUERY_EXECUTOR_INSTRUMENTATION_ENABLED:
+        query_executor = InstrumentedInjectiveQueryExecutor(executor=query_executor)
+        query_executor_metrics = query_executor.metrics
+    if QUERY_EXECUTOR_CACHE_ENABLED:
+        query_executor = CachingInjectiveQueryExecutor(executor=query_executor)
+    market_registry = async_runtime.run(load_market_registry(query_executor))
+    async_runtime.submit(market_registry.refresh_periodically(query_executor))
+
+    open_interest_tracker = None
+    if OPEN_INTEREST_STREAMING_ENABLED:
+        open_interest_tracker = OpenInterestTracker(
+            query_executor=query_executor,
+            market_registry=market_registry,
+        )
+        async_runtime.submit(open_interest_tracker.start())
+
+    orderbook_tracker = None
+    if ORDERBOOK_STREAMING_ENABLED:
+        orderbook_tracker = OrderbookTracker(
+            query_executor=query_executor,
+            market_registry=market_registry,
+        )
+        async_runtime.submit(orderbook_tracker.start())
+
+    runtime = MarketMonitorRuntime(
+        async_runtime=async_runtime,
+        client=client,
+        query_executor=query_executor,
+        market_registry=market_registry,
+        result_cache=PageResultCache(async_runtime=async_runtime),
+        open_interest_tracker=open_interest_tracker,
+        orderbook_tracker=orderbook_tracker,
+        snapshot_store=SnapshotStore(),
+        query_executor_metrics=query_executor_metrics,
+        page_specs=discover_pages(),
+    )
+    return runtime
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+
+from constants import SNAPSHOT_STORE_PATH
+
+CREATED_AT_METADATA_KEY = b"market_monitor.created_at"
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    name: str
+    generation: int
+    created_at: float
+    table: pa.Table
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+    @cached_property
+    def data(self) -> pd.DataFrame:
+        # Converted once per generation and shared by every reader of this snapshot
+        return self.table.to_pandas()
+
+
+class SnapshotStore:
+    """Latest computed table for each metric, published as memory-mapped Arrow IPC files.
+
+    Every write creates a new `{name}-{generation}.arrow` file and then atomically replaces the `{name}.generation`
+    pointer, so readers can detect a change by reading one small file. The table of the current generation is
+    memory-mapped once per process and shared by all the sessions that read it.
+    """
+
+    def __init__(self, root: str = SNAPSHOT_STORE_PATH):
+        self._root = root
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, Snapshot] = {}
+
+    def write(self, name: str, data: Union[pd.DataFrame, pa.Table], created_at: Optional[float] = None) -> int:
+        created_at = created_at if created_at is not None else time.time()
+        table = data if isinstance(data, pa.Table) else pa.Table.from_pandas(data)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            CREATED_AT_METADATA_KEY: str(created_at).encode(),
+        })
+
+        os.makedirs(self._root, exist_ok=True)
+        previous_generation = self.generation(name)
+        generation = (previous_generation or 0) + 1
+        path = self._table_path(name, generation)
+        temporary_path = f"{path}.tmp"
+        with pa.OSFile(temporary_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temporary_path, path)
+
+        pointer_path = self._pointer_path(name)
+        temporary_pointer_path = f"{pointer_path}.tmp"
+        with open(temporary_pointer_path, "w") as pointer_file:
+            pointer_file.write(str(generation))
+        os.replace(temporary_pointer_path, pointer_path)
+
+        # Readers that already mapped the previous file keep their mapping after it is unlinked
+        if previous_generation is not None:
+            for old_generation in range(max(1, previous_generation - 1), previous_generation):
+                try:
+                    os.remove(self._table_path(name, old_generation))
+                except FileNotFoundError:
+                    pass
+        return generation
+
+    def generation(self, name: str) -> Optional[int]:
+        try:
+            with open(self._pointer_path(name)) as pointer_file:
+                return int(pointer_file.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read(self, name: str) -> Optional[Snapshot]:
+        generation = self.generation(name)
+        if generation is None:
+            return None
+
+        with self._lock:
+            snapshot = self._snapshots.get(name)
+            if snapshot is not None and snapshot.generation == generation:
+                return snapshot
+
+            try:
+                source = pa.memory_map(self._table_path(name, generation), "r")
+            except FileNotFoundError:
+                # A writer published a newer generation and removed this file in the meantime
+                return snapshot
+            table = pa.ipc.open_file(source).read_all()
+            created_at = float(table.schema.metadata[CREATED_AT_METADATA_KEY])
+            snapshot = Snapshot(name=name, generation=generation, created_at=created_at, table=table)
+            self._snapshots[name] = snapshot
+            return snapshot
+
+    def _table_path(self, name: str, generation: int) -> str:
+        return os.path.join(self._root, f"{name}-{generation}.arrow")
+
+    def _pointer_path(self, name: str) -> str:
+        return os.path.join(self._root, f"{name}.generation")
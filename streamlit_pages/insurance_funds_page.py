@@ -1,35 +1,37 @@
-from liquidations import get_insurance_funds, _scale_balance
+from liquidations import get_insurance_funds, scale_token_amounts
 from streamlit_pages.streamlite_page import StreamlitPage
-import asyncio
-import time
 import streamlit as st
 import pandas as pd
-from pyinjective.async_client import AsyncClient
+from injective_query_executor import BaseInjectiveQueryExecutor
+
+from async_runtime import AsyncRuntime
 
 
 class InsuranceFundsPage(StreamlitPage):
     def __init__(self,
-                 loop: asyncio.AbstractEventLoop,
-                 client: AsyncClient,
+                 async_runtime: AsyncRuntime,
+                 query_executor: BaseInjectiveQueryExecutor,
                  **kwargs):
-        super().__init__(**kwargs)
-        self.event_loop = loop
-        self.client = client
-        self.token_symbol_and_denom_map = kwargs.get('token_symbol_and_denom_map')
-        self.tokens_map = kwargs.get('tokens_map')
+        super().__init__(async_runtime=async_runtime, **kwargs)
+        self.query_executor = query_executor
+        self.market_registry = kwargs.get('market_registry')
 
-    def display_page(self, *args, **kwargs):
-        st.empty()
-        insurance_funds = self.event_loop.run_until_complete(get_insurance_funds(self.client))
+    async def load_data(self) -> pd.DataFrame:
+        insurance_funds = await get_insurance_funds(self.query_executor)
+        market_registry = self.market_registry.current
 
         insurance_funds_df = pd.DataFrame(insurance_funds['funds'])
         insurance_funds_df.insert(3, 'depositDenomName', insurance_funds_df['depositDenom'].map(
-            self.token_symbol_and_denom_map.inv))
-        insurance_funds_df['balance'] = insurance_funds_df.apply(lambda row: _scale_balance(row, self.tokens_map), axis=1)
-        st.dataframe(insurance_funds_df, use_container_width=True)
+            market_registry.token_symbol_and_denom_map.inv))
+        insurance_funds_df['balance'] = scale_token_amounts(insurance_funds_df['balance'],
+                                                            insurance_funds_df['depositDenom'],
+                                                            market_registry.tokens_map)
+        return insurance_funds_df
 
-    def refresh_page(self, *args, **kwargs):
-        self.display_page(*args, **kwargs)
+    def display_page(self, *args, **kwargs):
+        st.empty()
+        insurance_funds_df = self.page_data(live=kwargs.get('live', False))
+        st.dataframe(insurance_funds_df, use_container_width=True)
 
     @classmethod
     def title(cls):
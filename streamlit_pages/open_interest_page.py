@@ -1,31 +1,47 @@
+import time
+
 from open_interest import get_open_interest
 from streamlit_pages.streamlite_page import StreamlitPage
-import asyncio
 import streamlit as st
 import pandas as pd
-from pyinjective.async_client import AsyncClient
+from injective_query_executor import BaseInjectiveQueryExecutor
+
+from async_runtime import AsyncRuntime
 
 
 class InsuranceFundsPage(StreamlitPage):
-    def __init__(self, loop: asyncio.AbstractEventLoop, client: AsyncClient, **kwargs):
-        super().__init__(**kwargs)
-        self.event_loop = loop
-        self.client = client
-        self.token_symbol_and_denom_map = kwargs.get('token_symbol_and_denom_map')
-        self.tokens_map = kwargs.get('tokens_map')
-        self.derivative_markets_map = kwargs.get('derivative_markets_map')
+    def __init__(self, async_runtime: AsyncRuntime, query_executor: BaseInjectiveQueryExecutor, **kwargs):
+        super().__init__(async_runtime=async_runtime, **kwargs)
+        self.query_executor = query_executor
+        self.market_registry = kwargs.get('market_registry')
+        self.open_interest_tracker = kwargs.get('open_interest_tracker')
+
+    async def load_data(self) -> pd.DataFrame:
+        open_interest = await get_open_interest(self.query_executor, self.market_registry.current)
+        return self._open_interest_df(open_interest)
 
     def display_page(self, *args, **kwargs):
         st.empty()
-        open_interest = self.event_loop.run_until_complete(get_open_interest(self.client, self.derivative_markets_map))
-
-        open_interest_df = pd.DataFrame(
-            [{'Trading Pair': k, 'Longs Notional': v[0], 'Shorts Notional': v[1]} for k, v in open_interest.items()])
+        if self.open_interest_tracker is not None and self.open_interest_tracker.is_synced:
+            open_interest_df = self._open_interest_df(self.open_interest_tracker.open_interest())
+        else:
+            open_interest_df = self.page_data(live=kwargs.get('live', False))
 
         st.write(open_interest_df)
 
-    def refresh_page(self, *args, **kwargs):
-        self.display_page(*args, **kwargs)
+    def last_updated(self):
+        if self.open_interest_tracker is not None and self.open_interest_tracker.is_synced:
+            return time.time()
+        return super().last_updated()
+
+    def prefetch(self, *args, **kwargs):
+        if self.open_interest_tracker is None or not self.open_interest_tracker.is_synced:
+            super().prefetch(*args, **kwargs)
+
+    @staticmethod
+    def _open_interest_df(open_interest) -> pd.DataFrame:
+        return pd.DataFrame(
+            [{'Trading Pair': k, 'Longs Notional': v[0], 'Shorts Notional': v[1]} for k, v in open_interest.items()])
 
     @classmethod
     def title(cls):
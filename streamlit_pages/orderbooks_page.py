@@ -0,0 +1,67 @@
+import time
+
+from constants import ORDERBOOK_DEPTH_PRICE_RANGE
+from orderbooks import OrderbookTracker
+from streamlit_pages.streamlite_page import StreamlitPage
+import streamlit as st
+import pandas as pd
+from injective_query_executor import BaseInjectiveQueryExecutor
+
+from async_runtime import AsyncRuntime
+
+
+class OrderbooksPage(StreamlitPage):
+    def __init__(self, async_runtime: AsyncRuntime, query_executor: BaseInjectiveQueryExecutor, **kwargs):
+        super().__init__(async_runtime=async_runtime, **kwargs)
+        self.query_executor = query_executor
+        self.market_registry = kwargs.get('market_registry')
+        self.orderbook_tracker = kwargs.get('orderbook_tracker')
+
+    async def load_data(self) -> pd.DataFrame:
+        # Without the live tracker, every book is snapshotted once
+        orderbook_tracker = OrderbookTracker(query_executor=self.query_executor, market_registry=self.market_registry)
+        await orderbook_tracker.load_snapshots()
+        return self._orderbooks_df(orderbook_tracker)
+
+    def display_page(self, *args, **kwargs):
+        st.empty()
+        if self.orderbook_tracker is not None and self.orderbook_tracker.is_synced:
+            orderbooks_df = self._orderbooks_df(self.orderbook_tracker)
+        else:
+            orderbooks_df = self.page_data(live=kwargs.get('live', False))
+
+        st.dataframe(orderbooks_df, use_container_width=True)
+
+    def last_updated(self):
+        if self.orderbook_tracker is not None and self.orderbook_tracker.is_synced:
+            return time.time()
+        return super().last_updated()
+
+    def prefetch(self, *args, **kwargs):
+        if self.orderbook_tracker is None or not self.orderbook_tracker.is_synced:
+            super().prefetch(*args, **kwargs)
+
+    @staticmethod
+    def _orderbooks_df(orderbook_tracker: OrderbookTracker) -> pd.DataFrame:
+        depth_column = f"{ORDERBOOK_DEPTH_PRICE_RANGE:.0%}"
+        rows = []
+        for market_id in orderbook_tracker.market_ids():
+            book = orderbook_tracker.book(market_id)
+            if book is None:
+                continue
+            best_bid, best_ask = book.best_bid(), book.best_ask()
+            mid_price = book.mid_price()
+            notional_within = book.notional_within(ORDERBOOK_DEPTH_PRICE_RANGE) or (None, None)
+            rows.append({
+                'Trading Pair': book.market.trading_pair(),
+                'Best Bid': best_bid[0] if best_bid is not None else None,
+                'Best Ask': best_ask[0] if best_ask is not None else None,
+                'Spread (bps)': (best_ask[0] - best_bid[0]) / mid_price * 10_000 if mid_price else None,
+                f'Bids Notional {depth_column}': notional_within[0],
+                f'Asks Notional {depth_column}': notional_within[1],
+            })
+        return pd.DataFrame(rows)
+
+    @classmethod
+    def title(cls):
+        return 'Orderbooks'
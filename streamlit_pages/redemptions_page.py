@@ -1,47 +1,66 @@
 import time
 
-from liquidations import get_redemptions, _transform_ts, _scale_disbursed
+from liquidations import get_redemptions, scale_token_amounts
 from streamlit_pages.streamlite_page import StreamlitPage
-import asyncio
 import streamlit as st
 import pandas as pd
-from pyinjective.async_client import AsyncClient
+from injective_query_executor import BaseInjectiveQueryExecutor
+
+from async_runtime import AsyncRuntime
 
 
 class RedemptionsPage(StreamlitPage):
     def __init__(self,
-                 loop: asyncio.AbstractEventLoop,
-                 client: AsyncClient,
+                 async_runtime: AsyncRuntime,
+                 query_executor: BaseInjectiveQueryExecutor,
                  **kwargs):
-        super().__init__(**kwargs)
-        self.event_loop = loop
-        self.client = client
-        self.token_symbol_and_denom_map = kwargs.get('token_symbol_and_denom_map')
-        self.tokens_map = kwargs.get('tokens_map')
+        super().__init__(async_runtime=async_runtime, **kwargs)
+        self.query_executor = query_executor
+        self.market_registry = kwargs.get('market_registry')
+        self.redemption_store = kwargs.get('redemption_store')
 
-    def display_page(self, *args, **kwargs):
-        st.empty()
-        redemptions = self.event_loop.run_until_complete(get_redemptions(self.client))
+    TIMESTAMP_COLUMNS = ('claimableRedemptionTime', 'requestedAt', 'disbursedAt')
+
+    async def load_data(self) -> pd.DataFrame:
+        redemptions = await get_redemptions(self.query_executor, store=self.redemption_store)
         redemptions_df = pd.DataFrame(redemptions['redemptionSchedules'])
         redemptions_df = redemptions_df.set_index('redemptionId')
+        for column in self.TIMESTAMP_COLUMNS:
+            redemptions_df[column] = pd.to_numeric(redemptions_df[column], errors='coerce').fillna(0).astype('int64')
+        return redemptions_df
+
+    def display_page(self, *args, **kwargs):
+        st.empty()
+        redemptions_df = self.page_data(live=kwargs.get('live', False))
+        redemptions_df = self.prepare_display_df(redemptions_df, days_lookback=kwargs.get('days_lookback'))
+        st.dataframe(
+            redemptions_df,
+            use_container_width=True,
+            column_config={
+                column: st.column_config.DatetimeColumn(format="ddd MMM DD YYYY HH:mm:ss")
+                for column in self.TIMESTAMP_COLUMNS
+            },
+        )
+
+    def prepare_display_df(self, redemptions_df: pd.DataFrame, days_lookback=None) -> pd.DataFrame:
+        if days_lookback:
+            start_timestamp = int((time.time() - days_lookback * 24 * 60 * 60) * 1e6)
+            redemptions_df = redemptions_df[redemptions_df['requestedAt'] >= start_timestamp]
+
+        redemptions_df = redemptions_df.copy()
+        market_registry = self.market_registry.current
         # pool_token_to_market_map = pd.Series(insurance_funds_df['marketTicker'].values,
         #                                      index=insurance_funds_df['poolTokenDenom']).to_dict()
         # redemptions_df.insert(6, 'poolMarketTicker', redemptions_df['redemptionDenom'].map(pool_token_to_market_map))
         redemptions_df.insert(8, 'disbursedTicker',
-                              redemptions_df['disbursedDenom'].map(self.token_symbol_and_denom_map.inv))
-        redemptions_df['claimableRedemptionTime'] = redemptions_df['claimableRedemptionTime'].apply(_transform_ts)
-        redemptions_df['requestedAt'] = redemptions_df['requestedAt'].apply(_transform_ts)
-        redemptions_df['disbursedAt'] = redemptions_df['disbursedAt'].apply(_transform_ts)
-        redemptions_df['disbursedAmount'] = redemptions_df.apply(lambda row: _scale_disbursed(row, self.tokens_map),
-                                                                 axis=1)
-        days_lookback = kwargs.get('days_lookback')
-        if days_lookback:
-            start_date = pd.Timestamp.now() - pd.Timedelta(days=days_lookback)
-            redemptions_df = redemptions_df[pd.to_datetime(redemptions_df['requestedAt']) >= start_date]
-        st.dataframe(redemptions_df, use_container_width=True)
-
-    def refresh_page(self, *args, **kwargs):
-        self.display_page(*args, **kwargs)
+                              redemptions_df['disbursedDenom'].map(market_registry.token_symbol_and_denom_map.inv))
+        for column in self.TIMESTAMP_COLUMNS:
+            timestamps = redemptions_df[column]
+            redemptions_df[column] = pd.to_datetime(timestamps.where(timestamps > 0), unit='us', utc=True)
+        redemptions_df['disbursedAmount'] = scale_token_amounts(redemptions_df['disbursedAmount'],
+                                                                redemptions_df['disbursedDenom'],
+                                                                market_registry.tokens_map)
+        return redemptions_df
 
     @classmethod
     def title(cls):
@@ -1,16 +1,138 @@
+import concurrent.futures
+import threading
+import time
 from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import streamlit as st
+
+from async_runtime import AsyncRuntime
+from constants import PAGE_LOAD_TIMEOUT_SECONDS, PAGE_RESULT_CACHE_TTL_SECONDS, SNAPSHOT_MAX_AGE_SECONDS
+from snapshot_store import Snapshot, SnapshotStore
+
+ResultKey = Tuple[str, Hashable]
+
+
+class PageResultCache:
+    """Page results shared by every session, loaded on the async runtime.
+
+    Only one load per key is in flight at a time. Expired results are still returned while a fresh load runs in the
+    background.
+    """
+
+    def __init__(self, async_runtime: AsyncRuntime, ttl: float = PAGE_RESULT_CACHE_TTL_SECONDS):
+        self._async_runtime = async_runtime
+        self._ttl = ttl
+        self._lock = threading.RLock()
+        self._results: Dict[ResultKey, Tuple[float, Any]] = {}
+        self._in_flight: Dict[ResultKey, concurrent.futures.Future] = {}
+
+    def get_or_load(self, page_title: str, key: Hashable, loader: Callable[[], Awaitable],
+                    timeout: Optional[float] = PAGE_LOAD_TIMEOUT_SECONDS) -> Any:
+        result_key = (page_title, key)
+        with self._lock:
+            entry = self._results.get(result_key)
+            if entry is not None and time.time() - entry[0] <= self._ttl:
+                return entry[1]
+            future = self._load(result_key, loader)
+        if entry is not None:
+            return entry[1]
+        return future.result(timeout=timeout)
+
+    def prefetch(self, page_title: str, key: Hashable, loader: Callable[[], Awaitable]):
+        result_key = (page_title, key)
+        with self._lock:
+            entry = self._results.get(result_key)
+            if entry is None or time.time() - entry[0] > self._ttl:
+                self._load(result_key, loader)
+
+    def loaded_at(self, page_title: str, key: Hashable) -> Optional[float]:
+        with self._lock:
+            entry = self._results.get((page_title, key))
+        return entry[0] if entry is not None else None
+
+    def invalidate(self, page_title: Optional[str] = None):
+        with self._lock:
+            if page_title is None:
+                self._results.clear()
+            else:
+                for result_key in [result_key for result_key in self._results if result_key[0] == page_title]:
+                    del self._results[result_key]
+
+    def _load(self, result_key: ResultKey, loader: Callable[[], Awaitable]) -> concurrent.futures.Future:
+        future = self._in_flight.get(result_key)
+        # A cancelled load can still be listed until its done callback runs
+        if future is None or future.cancelled():
+            future = self._async_runtime.submit(loader())
+            self._in_flight[result_key] = future
+            future.add_done_callback(lambda done_future: self._store(result_key, done_future))
+        return future
+
+    def _store(self, result_key: ResultKey, future: concurrent.futures.Future):
+        with self._lock:
+            if self._in_flight.get(result_key) is future:
+                del self._in_flight[result_key]
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._results[result_key] = (time.time(), future.result())
 
 
 class StreamlitPage(ABC):
     def __init__(self, *args, **kwargs):
-        ...
+        self.async_runtime: AsyncRuntime = kwargs.get('async_runtime')
+        self.result_cache: PageResultCache = kwargs.get('result_cache') or PageResultCache(self.async_runtime)
+        self.snapshot_store: Optional[SnapshotStore] = kwargs.get('snapshot_store')
 
     @abstractmethod
-    def display_page(self, *args, **kwargs):
+    async def load_data(self) -> Any:
         ...
 
-    @abstractmethod
+    @classmethod
+    def snapshot_name(cls) -> str:
+        return cls.title().lower().replace(' ', '_')
+
+    def page_data(self, live: bool = False) -> Any:
+        snapshot = None if live else self.latest_snapshot()
+        if snapshot is not None:
+            return snapshot.data
+        return self.cached_result(None, self.load_data)
+
+    def latest_snapshot(self) -> Optional[Snapshot]:
+        if self.snapshot_store is None:
+            return None
+        snapshot = self.snapshot_store.read(self.snapshot_name())
+        if snapshot is None or snapshot.age > SNAPSHOT_MAX_AGE_SECONDS:
+            return None
+        return snapshot
+
+    def last_updated(self) -> Optional[float]:
+        snapshot = self.latest_snapshot()
+        if snapshot is not None:
+            return snapshot.created_at
+        return self.result_cache.loaded_at(self.title(), None)
+
+    def cached_result(self, key: Hashable, loader: Callable[[], Awaitable]) -> Any:
+        for _ in range(2):
+            try:
+                return self.result_cache.get_or_load(self.title(), key, loader)
+            except concurrent.futures.CancelledError:
+                # The shared load was cancelled (e.g. the runtime is stopping), a new one is started once
+                continue
+            except concurrent.futures.TimeoutError:
+                break
+        st.info(f"{self.title()} data is still loading, refresh the page in a moment")
+        st.stop()
+
+    def prefetch(self, *args, **kwargs):
+        if self.latest_snapshot() is None:
+            self.result_cache.prefetch(self.title(), None, self.load_data)
+
     def refresh_page(self, *args, **kwargs):
+        self.result_cache.invalidate(self.title())
+        self.display_page(*args, live=True, **kwargs)
+
+    @abstractmethod
+    def display_page(self, *args, **kwargs):
         ...
 
     @classmethod
@@ -0,0 +1,186 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import replace
+from datetime import datetime
+from typing import Callable, Optional
+
+from constants import (
+    DATA_CACHE_DIR,
+    LIQUIDATION_ROLLUP_STORE_PATH,
+    MARKETS_SNAPSHOT_PATH,
+    QUERY_EXECUTOR_INSTRUMENTATION_ENABLED,
+    QUERY_EXECUTOR_METRICS_PATH,
+    QUERY_EXECUTOR_RESILIENCE_ENABLED,
+    REDEMPTION_STORE_PATH,
+    SNAPSHOT_STORE_PATH,
+    WORKER_INTERVAL_SECONDS,
+)
+from mongodb import MongoSettings
+from runtime import create_client, discover_pages, import_page_class
+from snapshot_store import SnapshotStore
+
+RECORDED_AT_FILE = "recorded_at.json"
+
+
+async def write_snapshots(pages, snapshot_store: SnapshotStore):
+    async def write_snapshot(page):
+        started_at = time.time()
+        try:
+            data = await page.load_data()
+        except Exception as e:
+            print(f"Failed to compute the {page.title()} snapshot: {e}")
+            return
+        snapshot_store.write(page.snapshot_name(), data, created_at=started_at)
+        print(f"Wrote the {page.title()} snapshot in {time.time() - started_at:.1f}s")
+
+    await asyncio.gather(*[write_snapshot(page) for page in pages])
+
+
+def write_metrics(metrics_text: str, path: str = QUERY_EXECUTOR_METRICS_PATH):
+    # Written in the format read by the Prometheus node exporter textfile collector
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as metrics_file:
+        metrics_file.write(metrics_text)
+    os.replace(temporary_path, path)
+
+
+async def sync_liquidations(store=None):
+    from liquidation_store import get_stored_liquidation_rollups
+
+    try:
+        await get_stored_liquidation_rollups(days=90, store=store)
+    except Exception as e:
+        print(f"Failed to sync the liquidation rollups: {e}")
+
+
+async def create_query_executor(record_directory: Optional[str] = None, replay_directory: Optional[str] = None,
+                                replay_latency: float = 0.0):
+    from injective_query_executor import PythonSDKInjectiveQueryExecutor
+    from recording import RecordingInjectiveQueryExecutor, ReplayInjectiveQueryExecutor
+    from resilient_query_executor import ResilientInjectiveQueryExecutor
+
+    if replay_directory:
+        return ReplayInjectiveQueryExecutor(directory=os.path.join(replay_directory, "injective"),
+                                            latency=replay_latency)
+
+    query_executor = PythonSDKInjectiveQueryExecutor(sdk_client=await create_client())
+    if QUERY_EXECUTOR_RESILIENCE_ENABLED:
+        query_executor = ResilientInjectiveQueryExecutor(executor=query_executor)
+    if record_directory:
+        query_executor = RecordingInjectiveQueryExecutor(executor=query_executor,
+                                                         directory=os.path.join(record_directory, "injective"))
+    return query_executor
+
+
+def recording_clock(record_directory: Optional[str] = None,
+                    replay_directory: Optional[str] = None) -> Callable[[], datetime]:
+    """Clock pinned to the time of the recording, saved with it, so the time windows of a replay match it."""
+    if replay_directory:
+        path = os.path.join(replay_directory, RECORDED_AT_FILE)
+        if not os.path.exists(path):
+            print(f"No recording time in {replay_directory}, replaying with the current time")
+            return datetime.now
+        with open(path) as recorded_at_file:
+            recorded_at = datetime.fromisoformat(json.load(recorded_at_file)["recorded_at"])
+    else:
+        recorded_at = datetime.now().replace(microsecond=0)
+        os.makedirs(record_directory, exist_ok=True)
+        with open(os.path.join(record_directory, RECORDED_AT_FILE), "w") as recorded_at_file:
+            json.dump({"recorded_at": recorded_at.isoformat()}, recorded_at_file)
+    return lambda: recorded_at
+
+
+async def run_worker(interval: float, once: bool, liquidations: bool, record_directory: Optional[str] = None,
+                     replay_directory: Optional[str] = None, replay_latency: float = 0.0):
+    from instrumented_query_executor import InstrumentedInjectiveQueryExecutor
+    from liquidation_store import LiquidationRollupStore
+    from market_registry import load_market_registry
+    from redemption_store import RedemptionStore
+
+    recording_directory = replay_directory or record_directory
+    clock = datetime.now
+    mongo_settings = None
+    data_directory = None
+    if recording_directory:
+        # Recorded and replayed runs start from empty local stores kept apart from the real ones, so both make the
+        # same calls at the same pinned time
+        clock = recording_clock(record_directory=record_directory, replay_directory=replay_directory)
+        mongo_settings = replace(
+            MongoSettings.from_env(),
+            record_directory=os.path.join(record_directory, "mongo") if record_directory else None,
+            replay_directory=os.path.join(replay_directory, "mongo") if replay_directory else None,
+            replay_latency=replay_latency,
+        )
+        data_directory = tempfile.mkdtemp(prefix="cache-", dir=recording_directory)
+
+    def local_path(path: str) -> str:
+        if data_directory is None:
+            return path
+        return os.path.join(data_directory, os.path.relpath(path, DATA_CACHE_DIR))
+
+    try:
+        query_executor = await create_query_executor(record_directory=record_directory,
+                                                     replay_directory=replay_directory,
+                                                     replay_latency=replay_latency)
+        if QUERY_EXECUTOR_INSTRUMENTATION_ENABLED:
+            query_executor = InstrumentedInjectiveQueryExecutor(executor=query_executor)
+        market_registry = await load_market_registry(query_executor,
+                                                     snapshot_path=local_path(MARKETS_SNAPSHOT_PATH))
+
+        snapshot_store = SnapshotStore(root=local_path(SNAPSHOT_STORE_PATH))
+        liquidation_rollup_store = LiquidationRollupStore(root=local_path(LIQUIDATION_ROLLUP_STORE_PATH),
+                                                          clock=clock,
+                                                          mongo_settings=mongo_settings)
+        pages = [
+            import_page_class(page_spec)(
+                async_runtime=None,
+                query_executor=query_executor,
+                market_registry=market_registry,
+                redemption_store=RedemptionStore(path=local_path(REDEMPTION_STORE_PATH)),
+            )
+            for page_spec in discover_pages().values()
+        ]
+
+        while True:
+            started_at = time.time()
+            await write_snapshots(pages, snapshot_store)
+            if liquidations:
+                await sync_liquidations(store=liquidation_rollup_store)
+            if QUERY_EXECUTOR_INSTRUMENTATION_ENABLED:
+                write_metrics(query_executor.metrics.prometheus_text(),
+                              path=local_path(QUERY_EXECUTOR_METRICS_PATH))
+            if once:
+                break
+            await asyncio.sleep(max(0.0, interval - (time.time() - started_at)))
+    finally:
+        if data_directory is not None:
+            shutil.rmtree(data_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Computes the dashboard metrics and writes them to the snapshot store")
+    parser.add_argument("--interval", type=float, default=WORKER_INTERVAL_SECONDS,
+                        help="seconds between two snapshot rounds")
+    parser.add_argument("--once", action="store_true", help="write one round of snapshots and exit")
+    parser.add_argument("--liquidations", action="store_true",
+                        help="also keep the local liquidation rollup store synced with Mongo")
+    parser.add_argument("--record", metavar="DIRECTORY",
+                        help="save every chain and Mongo response to DIRECTORY while computing the snapshots")
+    parser.add_argument("--replay", metavar="DIRECTORY",
+                        help="compute the snapshots from the responses saved with --record, without network access")
+    parser.add_argument("--replay-latency", type=float, default=0.0,
+                        help="seconds of simulated latency added to every replayed call")
+    args = parser.parse_args()
+
+    asyncio.run(run_worker(interval=args.interval,
+                           once=args.once,
+                           liquidations=args.liquidations,
+                           record_directory=args.record,
+                           replay_directory=args.replay,
+                           replay_latency=args.replay_latency))